@@ -1,5 +1,4 @@
 from fastapi import HTTPException, Depends, status
-from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from typing import Optional
@@ -7,17 +6,22 @@ from database import get_db
 from database_models import User
 from sqlalchemy.orm import Session
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import user_cache
+# Sync hashing helpers, re-exported for scripts; request handlers use the pool in hashing.py
+from hashing import hash_password, verify_password
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def token_claims(user) -> dict:
+    """Claims embedded in access tokens; "ver" lets a revocation refuse older tokens."""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "name": user.username,
+        "role": user.role,
+        "dept": user.department,
+        "ver": user.token_version or 0,
+    }
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -26,48 +30,84 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES) 
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS) 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": "refresh"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str, credentials_exception):
+def create_tokens(user) -> dict:
+    return {
+        "access_token": create_access_token(data=token_claims(user)),
+        "refresh_token": create_refresh_token(
+            data={"sub": user.email, "uid": user.id, "ver": user.token_version or 0}
+        ),
+    }
+
+def decode_token(token: str, credentials_exception) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        if payload.get("sub") is None:
             raise credentials_exception
-        return email
+        return payload
     except JWTError:
         raise credentials_exception
 
+def verify_token(token: str, credentials_exception):
+    return decode_token(token, credentials_exception)["sub"]
+
 
 security = HTTPBearer()
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    try:
-        email = verify_token(credentials.credentials, credentials_exception)
-        user = db.query(User).filter(User.email == email).first()
-        if user is None:
-            raise credentials_exception
-        return user
-    except Exception:
-        raise credentials_exception
 
+def get_user_from_token(token: str, db: Session):
+    """Return a read-only snapshot of the token's user, cached per worker and keyed by subject."""
+    claims = decode_token(token, credentials_exception())
+    if claims.get("type") == "refresh":
+        raise credentials_exception()
+
+    subject = claims["sub"]
+    cached = user_cache.cache.get(subject)
+    if cached is None:
+        generation = user_cache.cache.generation
+        # uid survives an email change; tokens issued before claims only carry the email
+        if "uid" in claims:
+            user = db.query(User).filter(User.id == claims["uid"]).first()
+        else:
+            user = db.query(User).filter(User.email == subject).first()
+        if user is not None:
+            cached = user_cache.cache.put(subject, user, generation)
+        # Read-only; end the transaction so the connection goes back to the pool
+        # instead of sitting idle in it for the rest of the request (async routes
+        # never use this session again)
+        db.rollback()
+        if cached is None:
+            raise credentials_exception()
+
+    # Role or department changed since issue: the client must refresh
+    if claims.get("ver", cached.token_version) != cached.token_version:
+        raise credentials_exception()
+    return cached
 
- 
\ No newline at end of file
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    try:
+        user = get_user_from_token(credentials.credentials, db)
+    except Exception:
+        raise credentials_exception()
+    # Lets replicas.py pin this user to the primary after they write
+    db.info["user_id"] = user.id
+    return user
@@ -0,0 +1,143 @@
+"""
+Sync vs async database path for the hot read endpoints.
+
+Starts the app under uvicorn twice, once with ASYNC_DB_ENABLED=false (the
+endpoints run on the psycopg2 engine in the threadpool) and once with it on
+(asyncpg), drives each with N concurrent keep-alive clients and prints
+requests/s and latency percentiles per endpoint. Development data only:
+
+    python -m benchmarks.async_reads --clients 500 --seconds 20
+
+Pass --base-url to benchmark an already running server instead.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from benchmarks.login_throughput import get_token
+
+ENDPOINTS = [
+    "/shoutouts/feed?limit=20",
+    "/achievements/leaderboard",
+    "/reactions/{shoutout_id}",
+    "/comments/{shoutout_id}",
+]
+
+
+async def http_get(reader, writer, host, path, token):
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, paths, token, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status = await http_get(reader, writer, host, path, token)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                errors[path] = errors.get(path, 0) + 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            if status >= 400:
+                errors[path] = errors.get(path, 0) + 1
+            else:
+                latencies.setdefault(path, []).append((time.perf_counter() - started) * 1000)
+    finally:
+        writer.close()
+
+
+async def drive(base_url, paths, token, clients, seconds):
+    host, port = base_url.split("//", 1)[1].rstrip("/").split(":")
+    latencies, errors = {}, {}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*[
+        client(host, int(port), paths, token, deadline, latencies, errors)
+        for _ in range(clients)
+    ])
+    return latencies, errors
+
+
+def report(label, latencies, errors, seconds):
+    print(f"\n== {label} ==")
+    total = sum(len(v) for v in latencies.values())
+    print(f"total: {total / seconds:.0f} req/s, {sum(errors.values())} errors")
+    for path, samples in sorted(latencies.items()):
+        samples.sort()
+        p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+        print(f"  {path:<30} {len(samples) / seconds:>7.0f} req/s  p50={p(0.5):.1f}ms  "
+              f"p99={p(0.99):.1f}ms  errors={errors.get(path, 0)}")
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.3)
+    raise SystemExit(f"Server at {base_url} did not start")
+
+
+def run(label, base_url, args, env=None):
+    server = None
+    if env is not None:
+        port = base_url.rsplit(":", 1)[1]
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", port, "--log-level", "warning"],
+            env={**os.environ, **env},
+        )
+    try:
+        wait_until_up(base_url)
+        token = get_token(base_url, args.email, args.password)
+        paths = [p.format(shoutout_id=args.shoutout_id) for p in ENDPOINTS]
+        latencies, errors = asyncio.run(drive(base_url, paths, token, args.clients, args.seconds))
+        report(label, latencies, errors, args.seconds)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--shoutout-id", type=int, default=1)
+    parser.add_argument("--email", default="bench_user@example.com")
+    parser.add_argument("--password", default="bench-password")
+    args = parser.parse_args()
+
+    if args.base_url:
+        run(args.base_url, args.base_url, args)
+        return
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    run("sync engine (threadpool)", base_url, args, env={"ASYNC_DB_ENABLED": "false"})
+    run("async engine (asyncpg)", base_url, args, env={"ASYNC_DB_ENABLED": "true"})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Endpoint benchmark through the ASGI app.
+
+Calls the key endpoints of every router in-process (no server, no network) at
+each concurrency level and records p50/p95/p99 latency, throughput and SQL
+statements per request, read from the Server-Timing header that
+QueryStatsMiddleware adds (switched on here, it is off by default). Results are written as JSON so releases can be
+diffed. Run against seeded development data:
+
+    python -m benchmarks.seed_data --scale 0.01
+    python -m benchmarks.endpoints --output benchmarks/baseline.json
+    python -m benchmarks.endpoints --compare benchmarks/baseline.json
+
+Requests are signed with tokens for seed_user_1 (admin endpoints: seed_user_0).
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+from sqlalchemy import text
+
+# Before config is imported: statement counts come from the Server-Timing header
+os.environ["QUERY_STATS_ENABLED"] = "true"
+os.environ["QUERY_STATS_SERVER_TIMING"] = "true"
+
+from auth import create_tokens
+from database import session
+from database_models import User
+from main import app, lifespan, bootstrap_state
+
+# (name, method, path, body, signed in as); {placeholders} are filled in from the data
+ENDPOINTS = [
+    ("users.profile", "GET", "/users/profile", None, "user"),
+    ("shoutouts.feed", "GET", "/shoutouts/feed?limit=20", None, "user"),
+    ("shoutouts.feed_department", "GET", "/shoutouts/feed?limit=20&department={department}", None, "user"),
+    ("shoutouts.search", "GET", "/shoutouts/search?q=release&limit=20", None, "user"),
+    ("shoutouts.my_shoutouts", "GET", "/shoutouts/my-shoutouts?limit=50", None, "user"),
+    ("shoutouts.dashboard_stats", "GET", "/shoutouts/dashboard/stats", None, "user"),
+    ("shoutouts.users_search", "GET", "/shoutouts/users/search?department=all&search=pri", None, "user"),
+    ("shoutouts.detail", "GET", "/shoutouts/{shoutout_id}", None, "user"),
+    ("reactions.counts", "GET", "/reactions/{shoutout_id}", None, "user"),
+    ("reactions.users_preview", "GET", "/reactions/{shoutout_id}/users", None, "user"),
+    ("reactions.users_page", "GET", "/reactions/{shoutout_id}/users?type=like&limit=50", None, "user"),
+    ("reactions.summary", "GET", "/reactions/summary?ids={page_ids}", None, "user"),
+    ("comments.list", "GET", "/comments/{shoutout_id}", None, "user"),
+    ("comments.preview", "GET", "/comments/preview?ids={page_ids}&n=3", None, "user"),
+    ("comments.page", "GET", "/comments/{shoutout_id}?cursor=&limit=20", None, "user"),
+    ("comments.thread", "GET", "/comments/thread/{thread_id}", None, "user"),
+    ("admin.stats", "GET", "/admin/stats", None, "admin"),
+    ("admin.top_contributors", "GET", "/admin/top-contributors", None, "admin"),
+    ("admin.most_tagged", "GET", "/admin/most-tagged", None, "admin"),
+    ("admin.top_departments", "GET", "/admin/top-departments", None, "admin"),
+    ("admin.activity_trend", "GET", "/admin/activity-trend?days=30", None, "admin"),
+    ("admin.reports", "GET", "/admin/reports", None, "admin"),
+    ("achievements.user", "GET", "/achievements/", None, "user"),
+    ("achievements.leaderboard", "GET", "/achievements/leaderboard", None, "user"),
+]
+# Writes change the data, so they only run with --writes
+WRITE_ENDPOINTS = [
+    ("reactions.toggle", "POST", "/reactions/{shoutout_id}", {"reaction_type": "like"}, "user"),
+    ("comments.create", "POST", "/comments/{shoutout_id}", {"content": "Benchmark comment"}, "user"),
+]
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def fixtures() -> dict:
+    db = session()
+    try:
+        def seeded(n):
+            user = db.query(User).filter(User.email == f"seed_user_{n}@example.com").first()
+            if user is None:
+                sys.exit("No seeded users; run python -m benchmarks.seed_data first")
+            return user
+
+        user, admin = seeded(1), seeded(0)
+        # A screen of cards, newest first
+        page_ids = db.execute(text("""
+            SELECT id FROM shoutouts
+            WHERE is_public = 'public' AND is_deleted = false
+            ORDER BY created_at DESC LIMIT 20
+        """)).scalars().all()
+        shoutout_id = page_ids[0]
+        # The largest public thread
+        thread_id = db.execute(text("""
+            SELECT c.id FROM comments c JOIN shoutouts s ON s.id = c.shoutout_id
+            WHERE c.parent_id IS NULL AND c.is_deleted = false
+              AND s.is_public = 'public' AND s.is_deleted = false
+            ORDER BY c.reply_count DESC LIMIT 1
+        """)).scalar()
+        rows = db.execute(text("""
+            SELECT relname, reltuples::bigint FROM pg_class
+            WHERE relname IN ('users', 'shoutouts', 'shoutout_tags', 'shoutout_reactions', 'comments')
+        """)).all()
+        return {
+            "tokens": {"user": create_tokens(user)["access_token"], "admin": create_tokens(admin)["access_token"]},
+            "params": {"shoutout_id": shoutout_id, "thread_id": thread_id, "page_ids": ",".join(map(str, page_ids)),
+                       "department": user.department},
+            "dataset": dict(rows),
+        }
+    finally:
+        db.close()
+
+
+async def asgi_request(method, path, token, body=None):
+    """One request straight through the ASGI app; returns (status, statement count)."""
+    url = urlsplit(path)
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"host", b"benchmark"), (b"authorization", f"Bearer {token}".encode())]
+    if body is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "root_path": "",
+        "path": url.path, "raw_path": url.path.encode(), "query_string": url.query.encode(),
+        "headers": headers, "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    sent, done = False, asyncio.Event()
+    response = {"status": None, "queries": None}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            for name, value in message["headers"]:
+                if name == b"server-timing":
+                    match = QUERIES.search(value.decode())
+                    response["queries"] = int(match.group(1)) if match else None
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    return response["status"], response["queries"]
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def run_endpoint(method, path, body, token, concurrency, requests, warmup):
+    for _ in range(warmup):
+        await asgi_request(method, path, token, body)
+
+    latencies, queries, errors = [], [], 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            status, count = await asgi_request(method, path, token, body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors += 1
+            if count is not None:
+                queries.append(count)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_avg": round(sum(queries) / len(queries), 2) if queries else None,
+        "queries_max": max(queries) if queries else None,
+    }
+
+
+async def run(args, endpoints, data):
+    results = {}
+    async with lifespan(app):
+        # Startup migrations run in the background; measure once they are done
+        while not bootstrap_state["done"]:
+            await asyncio.sleep(0.1)
+        for concurrency in args.concurrency:
+            for name, method, path, body, role in endpoints:
+                if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                    continue
+                result = await run_endpoint(method, path.format(**data["params"]), body, data["tokens"][role],
+                                            concurrency, args.requests, args.warmup)
+                results.setdefault(name, {})[str(concurrency)] = result
+                print(f"{name:<28} c={concurrency:<4} {result['throughput_rps']:>8.1f} req/s  "
+                      f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms  "
+                      f"queries={result['queries_avg']}  errors={result['errors']}")
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange vs {baseline_path} (latency: lower is better, throughput: higher is better)")
+    for name, levels in results.items():
+        for concurrency, now in levels.items():
+            before = baseline.get(name, {}).get(concurrency)
+            if not before:
+                continue
+            delta = lambda key: (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            queries = ""
+            if now["queries_avg"] != before["queries_avg"]:
+                queries = f"  queries {before['queries_avg']} -> {now['queries_avg']}"
+            print(f"{name:<28} c={concurrency:<4} p50 {delta('p50_ms'):+6.1f}%  p99 {delta('p99_ms'):+6.1f}%  "
+                  f"throughput {delta('throughput_rps'):+6.1f}%{queries}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="endpoint name prefixes, e.g. shoutouts admin.stats")
+    parser.add_argument("--writes", action="store_true", help="also run endpoints that write")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="earlier JSON results to diff against")
+    args = parser.parse_args()
+
+    data = fixtures()
+    endpoints = ENDPOINTS + (WRITE_ENDPOINTS if args.writes else [])
+    results = asyncio.run(run(args, endpoints, data))
+
+    report = {
+        "meta": {
+            "generated_at": datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dataset": data["dataset"],
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
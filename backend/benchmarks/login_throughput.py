@@ -0,0 +1,114 @@
+"""
+Feed latency under a burst of logins.
+
+Measures GET /shoutouts/feed latency on its own, then again while N clients log in
+as fast as they can, and reports login throughput and how many logins were
+shed with 503. Run against a running server (development data only):
+
+    python -m benchmarks.login_throughput --base-url http://127.0.0.1:8000 --logins 16
+
+The benchmark user is registered on first use.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def call(base_url, method, path, body=None, token=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(req, timeout=60) as res:
+            return res.status, json.loads(res.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def get_token(base_url, email, password):
+    status, body = call(base_url, "POST", "/users/login", {"email": email, "password": password})
+    if status == 401:
+        status, body = call(base_url, "POST", "/users/register", {
+            "username": "bench_user", "email": email, "password": password,
+            "department": "Engineering", "role": "employee",
+        })
+    if status != 200:
+        raise SystemExit(f"Could not log in or register the benchmark user (HTTP {status})")
+    return body["access_token"]
+
+
+def feed_latencies(base_url, token, stop, results):
+    while not stop.is_set():
+        started = time.perf_counter()
+        call(base_url, "GET", "/shoutouts/feed?limit=20", token=token)
+        results.append((time.perf_counter() - started) * 1000)
+
+
+def summarize(samples):
+    if not samples:
+        return "no samples"
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return (f"n={len(samples)} p50={statistics.median(samples):.1f}ms "
+            f"p95={p(0.95):.1f}ms p99={p(0.99):.1f}ms max={samples[-1]:.1f}ms")
+
+
+def measure_feed(base_url, token, seconds, readers, during=None):
+    stop, results = threading.Event(), []
+    threads = [threading.Thread(target=feed_latencies, args=(base_url, token, stop, results))
+               for _ in range(readers)]
+    for t in threads:
+        t.start()
+    outcome = during() if during else time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return results, outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", default="bench_user@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--logins", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--rounds", type=int, default=8, help="logins per client")
+    parser.add_argument("--readers", type=int, default=2, help="concurrent feed readers")
+    parser.add_argument("--baseline-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    token = get_token(args.base_url, args.email, args.password)
+
+    baseline, _ = measure_feed(args.base_url, token, args.baseline_seconds, args.readers)
+    print(f"feed, idle:          {summarize(baseline)}")
+
+    def login_burst():
+        statuses = []
+
+        def client(_):
+            for _ in range(args.rounds):
+                status, _ = call(args.base_url, "POST", "/users/login",
+                                 {"email": args.email, "password": args.password})
+                statuses.append(status)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.logins) as pool:
+            list(pool.map(client, range(args.logins)))
+        return statuses, time.perf_counter() - started
+
+    loaded, (statuses, elapsed) = measure_feed(args.base_url, token, 0, args.readers, during=login_burst)
+    ok, shed = statuses.count(200), statuses.count(503)
+    print(f"feed, during logins: {summarize(loaded)}")
+    print(f"logins: {ok} ok, {shed} shed (503), {len(statuses) - ok - shed} other "
+          f"in {elapsed:.1f}s = {ok / elapsed:.1f} logins/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Synthetic data generator for benchmarks.
+
+Bulk-loads users, shoutouts with tags, reactions and comments with COPY. Full
+scale is 50k users, 2M shoutouts, 10M reactions and 3M comments; --scale
+shrinks every table proportionally. Development databases only:
+
+    python -m benchmarks.seed_data --scale 0.01    # 500 users, 20k shoutouts
+    python -m benchmarks.seed_data                 # full volume
+
+Every seeded user signs in as seed_user_<n>@example.com with password
+bench-password; seed_user_0 is an admin. Rows are added to whatever is there,
+so seeding twice needs --reset, which removes previously seeded data first.
+The same --seed gives the same data.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from auth import hash_password
+from comment_threads import segment, depth, MAX_DEPTH
+from config import ENVIRONMENT
+from counters import rebuild_counters
+from database import engine, session
+from database_models import REACTION_TYPES
+from migrations import run_migrations
+from routers.admin import DEPARTMENTS
+from versioning import bump_version, SHOUTOUTS as SHOUTOUTS_SCOPE, USERS as USERS_SCOPE
+
+USERS, SHOUTOUTS, REACTIONS, COMMENTS = 50_000, 2_000_000, 10_000_000, 3_000_000
+PASSWORD = "bench-password"
+HISTORY_DAYS = 730
+
+FIRST_NAMES = ["Aarav", "Priya", "Maya", "Noah", "Liam", "Ava", "Ravi", "Sofia", "Ethan", "Isha",
+               "Lucas", "Zara", "Omar", "Mei", "Arjun", "Nina", "Leo", "Ananya", "Kai", "Elena"]
+LAST_NAMES = ["Sharma", "Smith", "Patel", "Garcia", "Chen", "Reddy", "Khan", "Müller", "Rossi", "Kim",
+              "Nair", "Lopez", "Iyer", "Brown", "Silva", "Das", "Tanaka", "Rao", "Novak", "Wilson"]
+CATEGORIES = ["teamwork", "innovation", "leadership", "customer_service", "problem_solving", "mentorship"]
+# Weighted: most shoutouts are public
+VISIBILITY = ["public"] * 7 + ["department_only"] * 2 + ["private"]
+REACTION_WEIGHTS = [40, 20, 15, 10, 6, 6, 3]
+REPLY_SHARE = 0.35
+TITLES = ["Great work on {}", "Thank you for {}", "Shoutout for {}", "Amazing effort on {}", "Kudos on {}"]
+TOPICS = ["the release", "the customer escalation", "onboarding the new hires", "the quarterly review",
+          "the migration", "the design sprint", "the incident response", "the sales pitch",
+          "the budget planning", "the hackathon", "the roadmap", "the accessibility audit"]
+MESSAGES = [
+    "Your teamwork on {} made a real difference to everyone involved.",
+    "Thanks for staying late to get {} over the line, it did not go unnoticed.",
+    "The way you handled {} was calm, clear and thoughtful.",
+    "Really appreciate the mentoring you gave the team during {}.",
+    "Innovative thinking on {} saved us weeks of effort.",
+]
+COMMENTS_TEXT = ["Well deserved!", "Congrats!", "So true, great job.", "Couldn't agree more.",
+                 "Thanks for all the help on this.", "Amazing work!", "This was a big one, nice!"]
+
+
+class RowStream:
+    """File-like object that COPY ... FROM STDIN reads; rows are encoded on demand."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = b""
+
+    def read(self, size=-1):
+        chunks, length = [self._buffer], len(self._buffer)
+        for row in self._rows:
+            line = ("\t".join(copy_value(v) for v in row) + "\n").encode()
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = b"".join(chunks)
+        if size < 0:
+            self._buffer = b""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_value(value) -> str:
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def copy_rows(raw, table: str, columns: list, rows) -> int:
+    started = time.perf_counter()
+    with raw.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (ENCODING 'UTF8')", RowStream(rows))
+        count = cur.rowcount
+        if "id" in columns:
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+    raw.commit()
+    print(f"{table:<20} {count:>10,} rows in {time.perf_counter() - started:.1f}s")
+    return count
+
+
+def next_id(raw, table: str) -> int:
+    with raw.cursor() as cur:
+        cur.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+        return cur.fetchone()[0]
+
+
+class Generator:
+    def __init__(self, args, first_user_id: int, first_shoutout_id: int, first_comment_id: int):
+        self.rng = random.Random(args.seed)
+        self.users = max(2, int(USERS * args.scale))
+        self.shoutouts = max(1, int(SHOUTOUTS * args.scale))
+        self.reactions_per_shoutout = REACTIONS / SHOUTOUTS
+        self.comments_per_shoutout = COMMENTS / SHOUTOUTS
+        self.first_user_id = first_user_id
+        self.first_shoutout_id = first_shoutout_id
+        self.first_comment_id = first_comment_id
+        self.departments = [DEPARTMENTS[i % len(DEPARTMENTS)] for i in range(self.users)]
+        self.end = datetime.utcnow()
+        self.start = self.end - timedelta(days=HISTORY_DAYS)
+
+    def user_id(self, index: int) -> int:
+        return self.first_user_id + index
+
+    def created_at(self, shoutout_index: int) -> datetime:
+        # Ids grow with time, as they do in production
+        span = (self.end - self.start).total_seconds()
+        return self.start + timedelta(seconds=span * shoutout_index / self.shoutouts)
+
+    def user_rows(self, hashed_password: str):
+        for i in range(self.users):
+            name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+            yield (
+                self.user_id(i), f"{name} {i}", f"seed_user_{i}@example.com", hashed_password,
+                self.departments[i], "admin" if i == 0 else "employee", True,
+                self.start - timedelta(days=self.rng.randint(0, 365)),
+            )
+
+    def shoutout_rows(self):
+        rng = self.rng
+        for i in range(self.shoutouts):
+            giver = rng.randrange(self.users)
+            # Most recognition stays within the giver's department
+            if rng.random() < 0.6:
+                receiver = (giver + len(DEPARTMENTS) * rng.randint(1, 50)) % self.users
+            else:
+                receiver = rng.randrange(self.users)
+            if receiver == giver:
+                receiver = (giver + 1) % self.users
+            topic = rng.choice(TOPICS)
+            created_at = self.created_at(i)
+            yield (
+                self.first_shoutout_id + i, rng.choice(TITLES).format(topic), rng.choice(MESSAGES).format(topic),
+                self.user_id(giver), self.user_id(receiver), self.departments[giver], self.departments[receiver],
+                rng.choice(CATEGORIES), rng.choice(VISIBILITY), created_at,
+                created_at + timedelta(hours=1) if rng.random() < 0.05 else None,
+                rng.random() < 0.01, False,
+            )
+
+    def per_shoutout(self, average: float):
+        """(shoutout index, count) pairs; a few shoutouts collect most of the engagement."""
+        for i in range(self.shoutouts):
+            yield i, min(self.users, round(self.rng.expovariate(1 / average))) if average else 0
+
+    def tag_rows(self):
+        for i in range(self.shoutouts):
+            for user in self.rng.sample(range(self.users), min(self.users, self.rng.choice([0, 1, 1, 2, 3]))):
+                yield self.first_shoutout_id + i, self.user_id(user)
+
+    def reaction_rows(self):
+        for i, count in self.per_shoutout(self.reactions_per_shoutout):
+            created_at = self.created_at(i)
+            types = self.rng.choices(REACTION_TYPES, REACTION_WEIGHTS, k=count)
+            for user, reaction_type in zip(self.rng.sample(range(self.users), count), types):
+                yield (self.first_shoutout_id + i, self.user_id(user), reaction_type,
+                       created_at + timedelta(minutes=self.rng.randint(1, 4320)), False)
+
+    def comment_rows(self):
+        comment_id = self.first_comment_id
+        for i, count in self.per_shoutout(self.comments_per_shoutout):
+            created_at = self.created_at(i)
+            times = sorted(created_at + timedelta(minutes=self.rng.randint(1, 4320)) for _ in range(count))
+            # About a third of the comments reply to an earlier one; threads need
+            # every row of the shoutout before reply counts are known
+            rows = []
+            for at in times:
+                parent = self.rng.choice(rows) if rows and self.rng.random() < REPLY_SHARE else None
+                path = segment(comment_id) if parent is None else f"{parent['path']}.{segment(comment_id)}"
+                if depth(path) >= MAX_DEPTH:
+                    parent, path = None, segment(comment_id)
+                rows.append({"id": comment_id, "parent": parent, "path": path, "replies": 0, "created_at": at})
+                ancestor = parent
+                while ancestor:
+                    ancestor["replies"] += 1
+                    ancestor = ancestor["parent"]
+                comment_id += 1
+            for row in rows:
+                yield (row["id"], self.first_shoutout_id + i, self.user_id(self.rng.randrange(self.users)),
+                       self.rng.choice(COMMENTS_TEXT), row["created_at"], False,
+                       row["parent"]["id"] if row["parent"] else None, row["path"], row["replies"])
+
+
+def reset():
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        seeded = "SELECT id FROM users WHERE email LIKE 'seed\\_user\\_%@example.com'"
+        # shoutout_reactions has no ON DELETE CASCADE; everything else follows the users
+        conn.execute(text(f"""
+            DELETE FROM shoutout_reactions
+            WHERE user_id IN ({seeded})
+               OR shoutout_id IN (SELECT id FROM shoutouts WHERE giver_id IN ({seeded}) OR receiver_id IN ({seeded}))
+        """))
+        conn.execute(text(f"DELETE FROM shoutout_reports WHERE reporter_id IN ({seeded})"))
+        deleted = conn.execute(text(f"DELETE FROM users WHERE id IN ({seeded})")).rowcount
+    print(f"Removed {deleted:,} seeded users and their data in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full volume")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="remove previously seeded data first")
+    args = parser.parse_args()
+
+    if ENVIRONMENT == "production":
+        sys.exit("Refusing to seed test data in production.")
+
+    run_migrations(engine)
+    if args.reset:
+        reset()
+
+    raw = engine.raw_connection()
+    try:
+        gen = Generator(args, next_id(raw, "users"), next_id(raw, "shoutouts"), next_id(raw, "comments"))
+        print(f"Seeding {gen.users:,} users and {gen.shoutouts:,} shoutouts")
+        copy_rows(raw, "users", ["id", "username", "email", "hashed_password", "department", "role",
+                                 "is_active", "joined_at"], gen.user_rows(hash_password(PASSWORD)))
+        copy_rows(raw, "shoutouts", ["id", "title", "message", "giver_id", "receiver_id", "giver_department",
+                                     "receiver_department", "category", "is_public", "created_at", "edited_at",
+                                     "is_deleted", "fanned_out"], gen.shoutout_rows())
+        copy_rows(raw, "shoutout_tags", ["shoutout_id", "tagged_user_id"], gen.tag_rows())
+        copy_rows(raw, "shoutout_reactions", ["shoutout_id", "user_id", "reaction_type", "created_at", "is_deleted"],
+                  gen.reaction_rows())
+        copy_rows(raw, "comments", ["id", "shoutout_id", "user_id", "content", "created_at", "is_deleted",
+                                    "parent_id", "path", "reply_count"], gen.comment_rows())
+    finally:
+        raw.close()
+
+    # Seeded shoutouts are not fanned out; timelines merge them in at read time
+    started = time.perf_counter()
+    db = session()
+    try:
+        rebuild_counters(db, commit=False)
+        bump_version(db, SHOUTOUTS_SCOPE, USERS_SCOPE)
+        db.commit()
+    finally:
+        db.close()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"Counters rebuilt and tables analyzed in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,25 @@
-from database import SessionLocal
+import sys
+from sqlalchemy import func
+from database import session
 from database_models import User
 
-def check_users():
-    db = SessionLocal()
+def check_users(limit: int = 20):
+    db = session()
     try:
-        users = db.query(User).all()
-        print(f"Total users in database: {len(users)}")
-        print("\nUser details:")
-        for user in users:
+        total = db.query(func.count(User.id)).scalar()
+        print(f"Total users in database: {total}")
+        print(f"\nUser details (first {limit}):")
+        for user in db.query(User).order_by(User.id).limit(limit):
             print(f"ID: {user.id}")
-            print(f"Name: {user.name}")
+            print(f"Name: {user.username}")
             print(f"Email: {user.email}")
             print(f"Department: {user.department}")
             print(f"Role: {user.role}")
             print(f"Joined: {user.joined_at}")
-            print(f"Password (hashed): {user.password[:20]}...")
+            print(f"Password (hashed): {user.hashed_password[:20]}...")
             print("-" * 50)
     finally:
         db.close()
 
 if __name__ == "__main__":
-    check_users()
+    check_users(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,259 @@
+"""
+Query-plan regression check for the hot read paths of every router.
+
+Seeds a synthetic dataset inside a transaction, calls the read endpoints
+directly while capturing the SQL they emit, and EXPLAINs each captured SELECT
+with sequential scans disabled. If the planner still falls back to a Seq Scan
+on one of the large tables, no index can serve that query and the check
+fails. Each path must also stay within its statement budget in QUERY_BUDGETS,
+which catches per-row (N+1) queries. The transaction is rolled back at the
+end, so nothing is persisted.
+
+Run against a development database:  python check_query_plans.py
+The exit status is non-zero when a hot path regressed.
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, text
+from starlette.requests import Request
+from starlette.responses import Response
+from config import ENVIRONMENT
+from database import engine, session
+from database_models import User, ShoutOut, ShoutOutTag, ShoutOutReaction, Comment, REACTION_TYPES
+from counters import rebuild_counters
+from comment_threads import segment
+import typeahead
+from query_stats import query_budget, QueryBudgetExceeded
+from routers import shoutouts, reactions, comments, admin, achievements
+
+# Tables large enough that a sequential scan on them is a regression
+HOT_TABLES = {
+    "users", "shoutouts", "shoutout_tags", "shoutout_reactions", "comments",
+    "shoutout_counters", "timeline_entries",
+}
+
+# Paths known to scan, with the reason. Keep this list short.
+ALLOWED_SEQ_SCANS = {}
+
+# Maximum statements per call. Pages hold 50 rows, so a per-row query blows these.
+QUERY_BUDGETS = {
+    "shoutouts.feed": 6,
+    "shoutouts.feed_department": 6,
+    "shoutouts.feed_search": 6,
+    "shoutouts.feed_timeline": 8,
+    "shoutouts.search": 6,
+    "shoutouts.my_shoutouts": 6,
+    "shoutouts.dashboard_stats": 8,
+    "shoutouts.users_search": 2,
+    "reactions.counts": 3,
+    "reactions.users_preview": 1,
+    "reactions.users_page": 1,
+    "reactions.summary": 1,
+    "comments.list": 2,
+    "comments.preview": 1,
+    "comments.page": 1,
+    "comments.thread": 1,
+    "admin.stats": 10,
+    "admin.top_contributors": 2,
+    "admin.most_tagged": 2,
+    "admin.top_departments": 2,
+    "admin.activity_trend": 2,
+    "achievements.user": 12,
+    "achievements.leaderboard": 6,
+}
+
+USERS, SHOUTOUTS, PER_SHOUTOUT = 300, 3000, 3
+
+
+def seed(db):
+    # Same data on every run, so plans and budgets are reproducible
+    random.seed(0)
+    now = datetime.utcnow()
+    db.execute(insert(User), [
+        {
+            "username": f"plan_user_{i}",
+            "email": f"plan_user_{i}@example.com",
+            "hashed_password": "x",
+            "department": admin.DEPARTMENTS[i % len(admin.DEPARTMENTS)],
+            "role": "admin" if i == 0 else "employee",
+            "is_active": True,
+            "joined_at": now,
+        }
+        for i in range(USERS)
+    ])
+    user_ids = [u.id for u in db.query(User.id).filter(User.email.like("plan_user_%"))]
+    departments = dict(db.query(User.id, User.department).filter(User.id.in_(user_ids)))
+
+    rows = []
+    for i in range(SHOUTOUTS):
+        giver, receiver = random.sample(user_ids, 2)
+        rows.append({
+            "title": f"Great work {i}",
+            "message": f"Thanks for the teamwork on release {i}",
+            "giver_id": giver,
+            "receiver_id": receiver,
+            "giver_department": departments[giver],
+            "receiver_department": departments[receiver],
+            "category": "teamwork",
+            "is_public": random.choice(["public", "public", "department_only", "private"]),
+            "created_at": now - timedelta(minutes=i),
+            "is_deleted": i % 50 == 0,
+            "fanned_out": False,
+        })
+    db.execute(insert(ShoutOut), rows)
+    shoutout_ids = [s.id for s in db.query(ShoutOut.id).filter(ShoutOut.giver_id.in_(user_ids))]
+
+    comment_ids = iter(db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('comments', 'id')) FROM generate_series(1, :n)"),
+        {"n": len(shoutout_ids) * PER_SHOUTOUT},
+    ).scalars().all())
+    tags, reacts, notes = [], [], []
+    for sid in shoutout_ids:
+        thread = None
+        for uid in random.sample(user_ids, PER_SHOUTOUT):
+            tags.append({"shoutout_id": sid, "tagged_user_id": uid})
+            reacts.append({"shoutout_id": sid, "user_id": uid, "reaction_type": random.choice(REACTION_TYPES),
+                           "created_at": now, "is_deleted": False})
+            # The first comment starts a thread; the others reply to it
+            cid = next(comment_ids)
+            notes.append({"id": cid, "shoutout_id": sid, "user_id": uid, "content": "Well deserved",
+                          "created_at": now, "is_deleted": False,
+                          "parent_id": thread["id"] if thread else None,
+                          "path": f"{thread['path']}.{segment(cid)}" if thread else segment(cid),
+                          "reply_count": 0 if thread else PER_SHOUTOUT - 1})
+            thread = thread or notes[-1]
+    db.execute(insert(ShoutOutTag), tags)
+    db.execute(insert(ShoutOutReaction), reacts)
+    db.execute(insert(Comment), notes)
+
+    rebuild_counters(db, commit=False)
+    db.execute(text("ANALYZE"))
+
+    viewer = db.query(User).filter(User.email == "plan_user_1@example.com").one()
+    admin_user = db.query(User).filter(User.email == "plan_user_0@example.com").one()
+    # A live public shoutout from the middle of the data, so every viewer may read it
+    middle = shoutout_ids[len(shoutout_ids) // 2]
+    shoutout_id = (
+        db.query(ShoutOut.id)
+        .filter(ShoutOut.id >= middle, ShoutOut.is_public == "public", ShoutOut.is_deleted == False)
+        .order_by(ShoutOut.id)
+        .first()[0]
+    )
+    return viewer, admin_user, shoutout_id
+
+
+def hot_paths(db, viewer, admin_user, shoutout_id):
+    def request(query=""):
+        return Request({"type": "http", "path": "/", "headers": [], "query_string": query.encode()})
+
+    # A screen of cards
+    page_ids = list(range(shoutout_id - 30, shoutout_id))
+    thread_id = db.query(Comment.id).filter(Comment.shoutout_id == shoutout_id, Comment.parent_id == None).scalar()
+    feed_args = dict(department="all", sender_id=None, date_from=None, date_to=None, search=None,
+                     skip=0, limit=50, cursor="", mode="all", current_user=viewer)
+    return {
+        "shoutouts.feed": lambda: shoutouts.read_shoutouts_feed(db, request(), Response(), **feed_args),
+        "shoutouts.feed_department": lambda: shoutouts.read_shoutouts_feed(
+            db, request(), Response(), **{**feed_args, "department": viewer.department}),
+        "shoutouts.feed_search": lambda: shoutouts.read_shoutouts_feed(
+            db, request(), Response(), **{**feed_args, "search": "teamwork"}),
+        "shoutouts.feed_timeline": lambda: shoutouts.read_shoutouts_feed(
+            db, request(), Response(), **{**feed_args, "mode": "timeline"}),
+        "shoutouts.search": lambda: shoutouts.search_shoutouts(
+            q="release", department="all", sender_id=None, date_from=None, date_to=None,
+            limit=20, cursor=None, db=db, current_user=viewer),
+        "shoutouts.my_shoutouts": lambda: shoutouts.get_my_shoutouts(
+            receiver_department="all", days=None, limit=50, cursor=None, db=db, current_user=viewer),
+        "shoutouts.dashboard_stats": lambda: shoutouts.get_dashboard_stats(
+            request(), Response(), db=db, current_user=viewer),
+        "shoutouts.users_search": lambda: shoutouts.search_users_by_department(
+            department="all", search="user_1", db=db, current_user=viewer),
+        "reactions.counts": lambda: reactions.read_reaction_counts(db, shoutout_id, viewer),
+        "reactions.users_preview": lambda: reactions.read_reactor_preview(db, shoutout_id, 3, viewer),
+        "reactions.users_page": lambda: reactions.read_reactor_page(db, shoutout_id, "like", None, 50, viewer),
+        "reactions.summary": lambda: reactions.read_reaction_summary(db, page_ids, viewer),
+        "comments.list": lambda: comments.read_comments(db, shoutout_id),
+        "comments.preview": lambda: comments.read_comment_previews(db, page_ids, 3, viewer),
+        "comments.page": lambda: comments.read_comment_page(db, shoutout_id, "", None, 20, viewer),
+        "comments.thread": lambda: comments.read_thread(db, thread_id, "", None, 100, viewer),
+        "admin.stats": lambda: admin.admin_stats(request(), Response(), db=db, current_user=admin_user),
+        "admin.top_contributors": lambda: admin.top_contributors(db=db, current_user=admin_user),
+        "admin.most_tagged": lambda: admin.most_tagged(db=db, current_user=admin_user),
+        "admin.top_departments": lambda: admin.top_departments(limit=8, db=db, current_user=admin_user),
+        "admin.activity_trend": lambda: admin.activity_trend(days=30, db=db, current_user=admin_user),
+        "achievements.user": lambda: achievements.get_user_achievements(db=db, current_user=viewer),
+        "achievements.leaderboard": lambda: achievements.read_leaderboard(
+            db, request(), Response(), current_user=viewer, top_n=5),
+    }
+
+
+def seq_scans(plan):
+    """Yield relation names of Seq Scan nodes anywhere in an EXPLAIN JSON plan."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def main():
+    if ENVIRONMENT == "production":
+        sys.exit("Refusing to seed test data in production.")
+
+    db = session()
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    failures = []
+    try:
+        viewer, admin_user, shoutout_id = seed(db)
+        paths = hot_paths(db, viewer, admin_user, shoutout_id)
+        # Built once per worker, not per request; searches then hit memory only
+        typeahead.index.rebuild(db)
+
+        conn = db.connection()
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+        for name, call in paths.items():
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                with query_budget(QUERY_BUDGETS[name], name):
+                    call()
+            except QueryBudgetExceeded as e:
+                failures.append((name, None, str(e)))
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+
+            statements = list({stmt: params for stmt, params in captured}.items())
+            for statement, params in statements:
+                plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", params).scalar()
+                scanned = sorted({r for r in seq_scans(plan[0]["Plan"]) if r in HOT_TABLES})
+                if not scanned:
+                    continue
+                if name in ALLOWED_SEQ_SCANS:
+                    print(f"[allowed] {name}: seq scan on {', '.join(scanned)} ({ALLOWED_SEQ_SCANS[name]})")
+                    continue
+                failures.append((name, scanned, statement))
+
+            print(f"[checked] {name}: {len(statements)} statement(s)")
+    finally:
+        db.rollback()
+        db.close()
+
+    for name, scanned, statement in failures:
+        if scanned is None:
+            print(f"\n[FAIL] {statement}")
+        else:
+            print(f"\n[FAIL] {name}: seq scan on {', '.join(scanned)}\n{statement}")
+
+    if failures:
+        sys.exit(1)
+    print("\nAll hot paths are index-backed and within their query budgets.")
+
+
+if __name__ == "__main__":
+    main()
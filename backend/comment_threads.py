@@ -0,0 +1,88 @@
+"""
+Reply threads for comments.
+
+Every comment stores a materialized path: the ids from its top-level comment
+down to itself, each zero-padded to SEGMENT digits and joined with dots, e.g.
+"0000000012.0000000034". Paths sort depth-first, so a whole thread is a single
+range scan on ix_comments_path, with no recursive query: the subtree of a
+comment is every path from its own up to path + "/" ("/" sorts right after
+"."). The column uses the "C" collation so that holds in every locale.
+
+reply_count counts the live replies at any depth below a comment. Writers
+adjust it on every ancestor, which the path already lists, in the same
+transaction as the comment itself.
+"""
+from fastapi import HTTPException
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+from counters import bump_counters
+from database_models import Comment
+
+SEGMENT = 10            # digits per id; enough for any integer key
+MAX_DEPTH = 8           # replies to a comment this deep are refused
+
+
+def segment(comment_id: int) -> str:
+    return str(comment_id).zfill(SEGMENT)
+
+
+def ancestor_ids(path: str) -> list:
+    """Ids along the path, top-level comment first and the comment itself last."""
+    return [int(part) for part in path.split(".")]
+
+
+def depth(path: str) -> int:
+    return path.count(".")
+
+
+def subtree(path: str):
+    """Filter for the comment with this path and every reply below it."""
+    return and_(Comment.path >= path, Comment.path < path + "/")
+
+
+def new_comment(db: Session, shoutout_id: int, user_id: int, content: str, created_at,
+                parent: Comment = None) -> Comment:
+    """
+    Add a comment, or a reply to `parent`. The id is drawn first because the
+    path includes it. The caller bumps comment_count and commits.
+    """
+    if parent is not None and depth(parent.path) + 1 >= MAX_DEPTH:
+        raise HTTPException(status_code=400, detail=f"Replies nest at most {MAX_DEPTH} levels deep")
+
+    comment_id = db.execute(select(func.nextval(func.pg_get_serial_sequence("comments", "id")))).scalar()
+    comment = Comment(
+        id=comment_id,
+        shoutout_id=shoutout_id,
+        user_id=user_id,
+        content=content,
+        created_at=created_at,
+        parent_id=parent.id if parent is not None else None,
+        path=segment(comment_id) if parent is None else f"{parent.path}.{segment(comment_id)}",
+    )
+    db.add(comment)
+    if parent is not None:
+        bump_replies(db, ancestor_ids(parent.path), 1)
+    return comment
+
+
+def bump_replies(db: Session, comment_ids: list, delta: int):
+    if not comment_ids or not delta:
+        return
+    db.query(Comment).filter(Comment.id.in_(comment_ids)).update(
+        {Comment.reply_count: Comment.reply_count + delta}, synchronize_session=False
+    )
+
+
+def delete_subtree(db: Session, comment: Comment) -> int:
+    """
+    Soft-delete a comment with all of its replies and keep comment_count and
+    the ancestors' reply_count in step. Returns how many comments were deleted.
+    """
+    if comment.is_deleted:
+        return 0
+    deleted = db.query(Comment).filter(subtree(comment.path), Comment.is_deleted == False).update(
+        {Comment.is_deleted: True}, synchronize_session=False
+    )
+    bump_replies(db, ancestor_ids(comment.path)[:-1], -deleted)
+    bump_counters(db, comment.shoutout_id, {"comment_count": -deleted})
+    return deleted
@@ -18,6 +18,68 @@ REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
 # Environment
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+# Apply schema migrations on startup (in the background; /ready reports progress)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+# Startup migrations give up on a table lock after this long and retry later,
+# rather than queueing live requests behind them
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_MS", "5000"))
+
+# Connection pool (per worker process). DB_STATEMENT_TIMEOUT_MS=0 disables the timeout.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Logs every statement synchronously; keep off unless debugging
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# Per-request SQL stats: one JSON log line per request. Times every statement,
+# so keep off in production unless investigating
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "false").lower() == "true"
+# Also report the stats to clients in a Server-Timing header; debugging only
+QUERY_STATS_SERVER_TIMING = os.getenv("QUERY_STATS_SERVER_TIMING", "false").lower() == "true"
+# Flag a statement run this many times with different parameters in one request (N+1)
+N_PLUS_ONE_DETECTION = os.getenv("N_PLUS_ONE_DETECTION", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Read replicas (comma-separated URLs) for read-only endpoints; empty = primary only
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_SECONDS = int(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+REPLICA_POOL_SIZE = int(os.getenv("REPLICA_POOL_SIZE", "5"))
+# After a write, the writer's reads stay on the primary this long
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Home timeline (fan-out on write). Shoutouts whose audience is larger than the
+# threshold are not copied into timelines and are merged in at read time instead.
+TIMELINE_ENABLED = os.getenv("TIMELINE_ENABLED", "false").lower() == "true"
+TIMELINE_FANOUT_THRESHOLD = int(os.getenv("TIMELINE_FANOUT_THRESHOLD", "5000"))
+TIMELINE_BACKFILL_SIZE = int(os.getenv("TIMELINE_BACKFILL_SIZE", "200"))
+
+# Live event stream (Postgres LISTEN/NOTIFY fan-out to SSE clients)
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# Authenticated-user cache (per worker; invalidated across workers via NOTIFY)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# bcrypt runs in its own process pool; requests beyond the queue limit get 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2"))
+
+# Reactions are acknowledged from memory and written in batches (see reaction_buffer.py).
+# Unflushed changes are lost if a worker dies; a clean shutdown flushes them unless disabled.
+REACTION_BUFFER_ENABLED = os.getenv("REACTION_BUFFER_ENABLED", "false").lower() == "true"
+REACTION_BUFFER_FLUSH_MS = int(os.getenv("REACTION_BUFFER_FLUSH_MS", "250"))
+REACTION_BUFFER_MAX_PENDING = int(os.getenv("REACTION_BUFFER_MAX_PENDING", "10000"))
+REACTION_BUFFER_FLUSH_ON_SHUTDOWN = os.getenv("REACTION_BUFFER_FLUSH_ON_SHUTDOWN", "true").lower() == "true"
+
+# Async (asyncpg) engine for the hot read endpoints; false serves them from the sync engine
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "true").lower() == "true"
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
 
 
 CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
@@ -0,0 +1,116 @@
+"""
+Maintenance of the denormalized shoutout_counters table.
+
+Writers call the bump/reset helpers before their own db.commit() so counters
+change in the same transaction as the comment or reaction itself. If they ever
+drift, rebuild everything from the source tables with:  python counters.py
+"""
+from fastapi import HTTPException
+from sqlalchemy import func, select, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database_models import ShoutOutCounter, Comment, ShoutOutReaction, ShoutOut, REACTION_TYPES
+
+COUNTER_COLUMNS = ["comment_count"] + [f"{t}_count" for t in REACTION_TYPES]
+
+
+def reaction_column(reaction_type: str) -> str:
+    if reaction_type not in REACTION_TYPES:
+        raise HTTPException(status_code=400, detail="Unknown reaction type")
+    return f"{reaction_type}_count"
+
+
+def bump_counters(db: Session, shoutout_id: int, deltas: dict):
+    """Apply deltas such as {"comment_count": 1} with a single upsert."""
+    deltas = {col: delta for col, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    table = ShoutOutCounter.__table__
+    stmt = insert(table).values(
+        shoutout_id=shoutout_id,
+        **{col: max(delta, 0) for col, delta in deltas.items()}
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.shoutout_id],
+        set_={col: table.c[col] + delta for col, delta in deltas.items()},
+    )
+    db.execute(stmt)
+
+
+def reaction_deltas(old_type, new_type) -> dict:
+    """Counter deltas for a reaction going from old_type to new_type (None = no reaction)."""
+    deltas = {}
+    if old_type == new_type:
+        return deltas
+    if old_type in REACTION_TYPES:
+        deltas[reaction_column(old_type)] = -1
+    if new_type is not None:
+        col = reaction_column(new_type)
+        deltas[col] = deltas.get(col, 0) + 1
+    return deltas
+
+
+def reset_counters(db: Session, shoutout_id: int):
+    table = ShoutOutCounter.__table__
+    stmt = insert(table).values(shoutout_id=shoutout_id)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.shoutout_id],
+        set_={col: 0 for col in COUNTER_COLUMNS},
+    )
+    db.execute(stmt)
+
+
+def rebuild_counters(db: Session, commit: bool = True):
+    """Recompute every shoutout's counters from comments and shoutout_reactions."""
+    comments_sq = (
+        select(Comment.shoutout_id, func.count(Comment.id).label("comment_count"))
+        .where(Comment.is_deleted == False)
+        .group_by(Comment.shoutout_id)
+        .subquery()
+    )
+    reactions_sq = (
+        select(
+            ShoutOutReaction.shoutout_id,
+            *[
+                func.count(ShoutOutReaction.id)
+                .filter(ShoutOutReaction.reaction_type == t)
+                .label(f"{t}_count")
+                for t in REACTION_TYPES
+            ],
+        )
+        .where(ShoutOutReaction.is_deleted == False)
+        .group_by(ShoutOutReaction.shoutout_id)
+        .subquery()
+    )
+
+    source = (
+        select(
+            ShoutOut.id,
+            func.coalesce(comments_sq.c.comment_count, 0),
+            *[func.coalesce(reactions_sq.c[f"{t}_count"], 0) for t in REACTION_TYPES],
+        )
+        .outerjoin(comments_sq, comments_sq.c.shoutout_id == ShoutOut.id)
+        .outerjoin(reactions_sq, reactions_sq.c.shoutout_id == ShoutOut.id)
+    )
+
+    table = ShoutOutCounter.__table__
+    stmt = insert(table).from_select(["shoutout_id"] + COUNTER_COLUMNS, source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.shoutout_id],
+        set_={col: literal_column(f"excluded.{col}") for col in COUNTER_COLUMNS},
+    )
+    db.execute(stmt)
+    if commit:
+        db.commit()
+
+
+if __name__ == "__main__":
+    from database import session
+
+    db = session()
+    try:
+        rebuild_counters(db)
+        print("Shoutout counters rebuilt.")
+    finally:
+        db.close()
@@ -1,7 +1,15 @@
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL, ENVIRONMENT
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi.concurrency import run_in_threadpool
+from config import (
+    DATABASE_URL, ASYNC_DB_ENABLED, ASYNC_DB_POOL_SIZE, ASYNC_DB_MAX_OVERFLOW,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_STATEMENT_TIMEOUT_MS, DB_ECHO,
+)
+from pool_metrics import PoolMetrics, instrumented_pool
 import logging
 
 # Set up logging for database connection
@@ -12,24 +20,32 @@ logger = logging.getLogger(__name__)
 if not DATABASE_URL.startswith("postgresql"):
     raise ValueError("Only PostgreSQL databases are supported. Please check your DATABASE_URL.")
 
+sync_pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+
 engine = create_engine(
     DATABASE_URL,
-    echo=(ENVIRONMENT == "development"),  # Enable SQL logging in development
+    echo=DB_ECHO,
+    poolclass=instrumented_pool(QueuePool, sync_pool_metrics),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
     pool_pre_ping=True,  # Verify connections before use
-    pool_recycle=300,    # Recycle connections every 5 minutes
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args=(
+        {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"} if DB_STATEMENT_TIMEOUT_MS else {}
+    ),
 )
+sync_pool_metrics.attach(engine)
 
-logger.info("Configured PostgreSQL engine")
+logger.info(f"Configured PostgreSQL engine (pool {DB_POOL_SIZE}+{DB_MAX_OVERFLOW}, timeout {DB_POOL_TIMEOUT}s)")
 
 session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Test connection on import
-try:
+# No connection is opened at import time; main.py's /ready probe checks it
+def check_connection():
     with engine.connect() as conn:
-        logger.info("Database connection successful.")
-except Exception as e:
-    logger.error(f"Database connection failed: {e}")
-    raise
+        conn.execute(text("SELECT 1"))
 
 def get_db():
     db = session()
@@ -38,4 +54,83 @@ def get_db():
     finally:
         db.close()
 
-    
+
+# -------------------- Async engine (asyncpg) --------------------
+# Created on first use so the sync-only paths (scripts, migrations) never need asyncpg.
+_async_engine = None
+_async_session = None
+
+
+def async_database_url(database_url: str = DATABASE_URL):
+    """URL and connect args for asyncpg, which takes `ssl` instead of `sslmode`."""
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    connect_args = {}
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode", "channel_binding"])
+        connect_args["ssl"] = sslmode
+    if DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    return url, connect_args
+
+
+def get_async_engine():
+    global _async_engine, _async_session
+    if _async_engine is None:
+        url, connect_args = async_database_url()
+        _async_engine = create_async_engine(
+            url,
+            connect_args=connect_args,
+            echo=DB_ECHO,
+            poolclass=instrumented_pool(AsyncAdaptedQueuePool, async_pool_metrics),
+            pool_size=ASYNC_DB_POOL_SIZE,
+            max_overflow=ASYNC_DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+        async_pool_metrics.attach(_async_engine.sync_engine)
+        _async_session = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+        logger.info("Configured asyncpg engine")
+    return _async_engine
+
+
+async def get_async_db():
+    """
+    Session for async read endpoints. With ASYNC_DB_ENABLED=false this yields a
+    regular sync Session instead, and run_db() falls back to the threadpool.
+    """
+    if not ASYNC_DB_ENABLED:
+        db = session()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+        return
+
+    get_async_engine()
+    async with _async_session() as db:
+        yield db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Run fn(sync_session, *args, **kwargs) on the session from get_async_db.
+    On an AsyncSession the ORM code runs on the event loop and awaits asyncpg
+    for every round trip, so no thread is held while waiting on the database.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def pool_stats() -> dict:
+    return {
+        "sync": sync_pool_metrics.snapshot(),
+        "async": async_pool_metrics.snapshot() if _async_engine is not None else None,
+    }
@@ -1,11 +1,19 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Text, Enum, UniqueConstraint, Index, Computed, text
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import func
 from datetime import datetime
 
 Base = declarative_base()
 
+# Full-text document for shoutout search, title weighted above message.
+# Kept as a stored generated column so Postgres maintains it on every write.
+SHOUTOUT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(message, '')), 'B')"
+)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -13,10 +21,12 @@ class User(Base):
     username = Column(String, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
-    department = Column(String, nullable=True)
+    department = Column(String, nullable=True, index=True)
     role = Column(Enum("employee", "admin", name="user_role"), default="employee") 
     is_active = Column(Boolean, default=True)
     joined_at = Column(DateTime, default=datetime.utcnow)  
+    # Bumped whenever claims embedded in access tokens go stale
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     @property
     def is_admin(self):
@@ -57,12 +67,83 @@ class ShoutOut(Base):
     image_url = Column(String, nullable=True)   
     edited_at = Column(DateTime, nullable=True, onupdate=datetime.utcnow)
     is_deleted = Column(Boolean, default=False)
+    fanned_out = Column(Boolean, default=False, server_default="false", nullable=False)
+    search_vector = deferred(Column(TSVECTOR, Computed(SHOUTOUT_SEARCH_VECTOR, persisted=True)))
 
     # Relationships
     giver = relationship("User", foreign_keys=[giver_id], back_populates="given_shoutouts")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_shoutouts")
     tags = relationship("ShoutOutTag", back_populates="shoutout", cascade="all, delete-orphan", lazy="joined")
     reactions = relationship("ShoutOutReaction", back_populates="shoutout", cascade="all, delete-orphan")
+    counters = relationship("ShoutOutCounter", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Feed visibility filter (public / department_only / private) + newest first
+        Index(
+            "ix_shoutouts_visibility_created",
+            "is_public", "created_at",
+            postgresql_where=text("is_deleted = false"),
+        ),
+        # Keyset pagination of the feed on (created_at, id)
+        Index(
+            "ix_shoutouts_created_id",
+            "created_at", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+        # Full-text search over title + message
+        Index("ix_shoutouts_search_vector", "search_vector", postgresql_using="gin"),
+        # Timeline reads merge in shoutouts that were not fanned out
+        Index(
+            "ix_shoutouts_not_fanned_out",
+            "created_at", "id",
+            postgresql_where=text("is_deleted = false AND fanned_out = false"),
+        ),
+        # Per-user and per-department aggregates (dashboard, achievements,
+        # leaderboard, admin stats) and my-shoutouts
+        Index("ix_shoutouts_giver", "giver_id", "created_at", postgresql_where=text("is_deleted = false")),
+        Index("ix_shoutouts_receiver", "receiver_id", "created_at", postgresql_where=text("is_deleted = false")),
+        Index("ix_shoutouts_giver_department", "giver_department", postgresql_where=text("is_deleted = false")),
+        Index("ix_shoutouts_receiver_department", "receiver_department", postgresql_where=text("is_deleted = false")),
+    )
+
+
+# Reaction types offered by the UI; each one has a column on ShoutOutCounter
+REACTION_TYPES = ["like", "love", "clap", "celebrate", "insightful", "support", "star"]
+
+
+class ShoutOutCounter(Base):
+    """
+    Denormalized engagement counts per shoutout, kept in step with comments and
+    reactions by counters.py in the same transaction as the write.
+    """
+    __tablename__ = "shoutout_counters"
+
+    shoutout_id = Column(Integer, ForeignKey("shoutouts.id", ondelete="CASCADE"), primary_key=True)
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    love_count = Column(Integer, nullable=False, default=0, server_default="0")
+    clap_count = Column(Integer, nullable=False, default=0, server_default="0")
+    celebrate_count = Column(Integer, nullable=False, default=0, server_default="0")
+    insightful_count = Column(Integer, nullable=False, default=0, server_default="0")
+    support_count = Column(Integer, nullable=False, default=0, server_default="0")
+    star_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    def reaction_counts(self) -> dict:
+        return {t: getattr(self, f"{t}_count") for t in REACTION_TYPES}
+
+
+class TimelineEntry(Base):
+    """A shoutout copied into one viewer's home timeline (fan-out on write)."""
+    __tablename__ = "timeline_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    shoutout_id = Column(Integer, ForeignKey("shoutouts.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_timeline_entries_user_created", "user_id", "created_at", "shoutout_id"),
+        Index("ix_timeline_entries_shoutout", "shoutout_id"),
+    )
 
 
 class ShoutOutTag(Base):
@@ -76,6 +157,11 @@ class ShoutOutTag(Base):
     shoutout = relationship("ShoutOut", back_populates="tags")
     tagged_user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_shoutout_tags_shoutout", "shoutout_id"),
+        Index("ix_shoutout_tags_tagged_user", "tagged_user_id"),
+    )
+
 class ShoutOutReaction(Base):
     __tablename__ = "shoutout_reactions"
 
@@ -90,6 +176,10 @@ class ShoutOutReaction(Base):
 
     __table_args__ = (
     UniqueConstraint("shoutout_id", "user_id", name="unique_user_shoutout_reaction"),
+    # Lookups by shoutout use the unique constraint above; this one serves per-user counts
+    Index("ix_shoutout_reactions_user", "user_id"),
+    # Reactor lists: newest reactors of one type, read in index order
+    Index("ix_shoutout_reactions_type_created", "shoutout_id", "reaction_type", "created_at", "id"),
     )
 
 class ShoutOutReport(Base):
@@ -130,8 +220,33 @@ class Comment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     edited_at = Column(DateTime, onupdate=datetime.utcnow)
     is_deleted = Column(Boolean, default=False)
+    # Threads (see comment_threads.py): path is the zero-padded ids from the
+    # top-level comment down to this one, so a subtree is one range of paths.
+    # reply_count counts live replies at any depth below this comment.
+    parent_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True)
+    path = Column(String(collation="C"), nullable=False)
+    reply_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationships
     user = relationship("User", backref="comments")
     shoutout = relationship("ShoutOut", backref="comments")
 
+    __table_args__ = (
+        # Comment lists per shoutout (oldest first) and per-author counts
+        Index("ix_comments_shoutout_created", "shoutout_id", "created_at", postgresql_where=text("is_deleted = false")),
+        Index("ix_comments_user", "user_id", postgresql_where=text("is_deleted = false")),
+        # Keyset pages of top-level comments, and whole threads in path order
+        Index("ix_comments_shoutout_top_level", "shoutout_id", "created_at", "id",
+              postgresql_where=text("is_deleted = false AND parent_id IS NULL")),
+        Index("ix_comments_path", "path", postgresql_where=text("is_deleted = false")),
+        # ON DELETE CASCADE from a parent looks its replies up here
+        Index("ix_comments_parent", "parent_id", postgresql_where=text("parent_id IS NOT NULL")),
+    )
+
+
+class ResourceVersion(Base):
+    """Change counter per resource scope, used to build cheap ETags."""
+    __tablename__ = "resource_versions"
+
+    scope = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
@@ -0,0 +1,178 @@
+"""
+Live shoutout events for connected clients.
+
+Writers call publish() inside their transaction; it issues pg_notify so the
+event is delivered only if (and when) the transaction commits. Every worker
+process runs one listener thread on its own connection that LISTENs on the
+channel and hands events to the local EventBroker, which filters them by the
+subscriber's visibility and queues them for the SSE stream in main.py. Other
+modules route their own channels through the same listener with on().
+
+Each subscriber has a bounded queue. A consumer that falls behind has its
+backlog dropped and receives a single "resync" event telling it to refetch.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from dataclasses import dataclass, field
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config import EVENTS_QUEUE_SIZE
+from database_models import ShoutOut
+from visibility import can_view
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "bragboard_events"
+
+# Shoutout fields the broker needs to decide who may see an event
+AUDIENCE_FIELDS = ("is_public", "giver_id", "receiver_id", "giver_department", "receiver_department")
+
+
+def audience(shoutout: ShoutOut) -> dict:
+    return {f: getattr(shoutout, f) for f in AUDIENCE_FIELDS}
+
+
+def publish(db: Session, event_type: str, shoutout: ShoutOut, actor_id: int,
+            previous_audience: dict = None, **data):
+    """
+    Queue an event for delivery on commit. NOTIFY payloads are limited to 8kB,
+    so events carry ids only; clients refetch what they need.
+    """
+    audiences = [audience(shoutout)]
+    if previous_audience and previous_audience != audiences[0]:
+        # Viewers who just lost access still need to hear about the change
+        audiences.append(previous_audience)
+
+    payload = {
+        "type": event_type,
+        "shoutout_id": shoutout.id,
+        "actor_id": actor_id,
+        "audiences": audiences,
+        "data": data,
+    }
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": json.dumps(payload, default=str)},
+    )
+
+
+@dataclass(eq=False)
+class Subscriber:
+    user_id: int
+    department: str
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE))
+    dropped: int = 0
+
+    @property
+    def id(self):
+        return self.user_id
+
+
+class EventBroker:
+    def __init__(self):
+        self.subscribers = set()
+        self.loop = None
+        self._listener = None
+        self._stop = threading.Event()
+        # channel -> (handler(payload), on_gap()) run on the listener thread
+        self.channels = {CHANNEL: (self._deliver, None)}
+
+    def on(self, channel: str, handler, on_gap=None):
+        """
+        Route NOTIFY payloads on another channel to handler. on_gap is called
+        after the listener reconnects, since notifications may have been missed.
+        """
+        self.channels[channel] = (handler, on_gap)
+
+    # ---------- subscriptions (event loop thread) ----------
+    def subscribe(self, user_id: int, department: str) -> Subscriber:
+        self.loop = asyncio.get_running_loop()
+        self.ensure_listener()
+        subscriber = Subscriber(user_id=user_id, department=department)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def dispatch(self, event: dict):
+        audiences = event.pop("audiences", [])
+        for sub in list(self.subscribers):
+            if not any(can_view(sub, a) for a in audiences):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop its backlog instead of growing without bound
+                sub.dropped += sub.queue.qsize()
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait({"type": "resync"})
+
+    # ---------- LISTEN thread ----------
+    def ensure_listener(self):
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen(self):
+        from database import engine
+
+        connected_before = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                # A dedicated connection, taken out of the pool for good
+                conn = engine.raw_connection()
+                conn.detach()
+                # driver_connection is cleared by detach(); dbapi_connection stays set
+                dbapi_conn = conn.dbapi_connection
+                dbapi_conn.autocommit = True
+                listening = set()
+
+                if connected_before:
+                    for _, on_gap in list(self.channels.values()):
+                        if on_gap:
+                            on_gap()
+                connected_before = True
+
+                while not self._stop.is_set():
+                    # Pick up channels registered after the listener started
+                    for channel in set(self.channels) - listening:
+                        with dbapi_conn.cursor() as cur:
+                            cur.execute(f"LISTEN {channel}")
+                        listening.add(channel)
+
+                    if select.select([dbapi_conn], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        notify = dbapi_conn.notifies.pop(0)
+                        handler, _ = self.channels.get(notify.channel, (None, None))
+                        if handler:
+                            handler(notify.payload)
+            except Exception as e:
+                logger.error(f"Event listener error, reconnecting: {e}")
+                self._stop.wait(2)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _deliver(self, payload: str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        if self.loop and self.subscribers:
+            self.loop.call_soon_threadsafe(self.dispatch, event)
+
+
+broker = EventBroker()
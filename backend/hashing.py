@@ -0,0 +1,116 @@
+"""
+Password hashing off the request threads.
+
+bcrypt costs ~250ms of CPU per call. Running it in Starlette's shared
+threadpool lets a burst of logins starve every other sync endpoint, so async
+handlers hand it to a small dedicated process pool instead. At most
+PASSWORD_HASH_QUEUE calls may be running or waiting; beyond that requests are
+shed with 503 and Retry-After rather than queued without bound. If a worker
+dies (e.g. OOM-killed) the broken pool is replaced and the call retried once.
+
+This module is imported by the pool's worker processes, so it must stay free
+of database and app imports.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_RETRY_AFTER
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# -------------------- Sync (scripts and worker processes) --------------------
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+# -------------------- Async (request handlers) --------------------
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+stats = {"completed": 0, "failed": 0, "shed": 0, "pool_restarts": 0}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: never fork a process that holds DB connections and threads
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drop a pool whose worker died (e.g. OOM-killed); the next call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        # Every call in flight on the broken pool fails; only the first replaces it
+        if _executor is executor:
+            _executor = None
+            stats["pool_restarts"] += 1
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _unavailable(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+    )
+
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= PASSWORD_HASH_QUEUE:
+        stats["shed"] += 1
+        raise _unavailable("Too many sign-in requests, please retry shortly")
+    # Only the event loop thread touches _in_flight, so no lock is needed
+    _in_flight += 1
+    try:
+        # A broken pool is replaced and the call retried once on the new one
+        for attempt in range(2):
+            executor = _get_executor()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                _discard_executor(executor)
+                if attempt:
+                    raise _unavailable("Sign-in is temporarily unavailable, please retry shortly")
+                continue
+            stats["completed"] += 1
+            return result
+    except Exception:
+        stats["failed"] += 1
+        raise
+    finally:
+        _in_flight -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(verify_password, plain_password, hashed_password)
+
+
+def queue_depth() -> int:
+    return _in_flight
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
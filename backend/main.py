@@ -1,15 +1,78 @@
 
-from fastapi import FastAPI, Depends
-from database import engine, get_db
+from fastapi import FastAPI, Depends, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio, json, logging
+from database import engine, get_db, session, dispose_async_engine, pool_stats, check_connection
+from auth import get_user_from_token, get_current_user
+from config import EVENTS_HEARTBEAT_SECONDS, AUTO_MIGRATE, QUERY_STATS_ENABLED
+from database_models import User
+from events import broker
+import typeahead
+import user_cache
+import hashing
+import replicas
+import reaction_buffer
+from query_stats import QueryStatsMiddleware
 from routers import users, shoutouts, reactions,comments, admin, achievements
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from database_models import Base
+from migrations import run_migrations
 from fastapi.staticfiles import StaticFiles
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="BragBoard API", version="1.0.0")
+# Startup work that needs the database runs after the server is listening, so a
+# database blip delays readiness (see /ready) instead of crashing the process.
+bootstrap_state = {"done": False, "error": None}
+
+async def bootstrap():
+    delay = 1
+    while AUTO_MIGRATE:
+        try:
+            await run_in_threadpool(run_migrations, engine)
+            break
+        except Exception as e:
+            bootstrap_state["error"] = str(e)
+            logger.error(f"Startup migrations failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    bootstrap_state.update(done=True, error=None)
+    await run_in_threadpool(typeahead.warm)
+
+# Until bootstrap finishes, routes that use the database answer 503 instead of
+# queueing behind (and holding locks against) the migrations' table locks
+BOOTSTRAP_EXEMPT_PATHS = {"/", "/health", "/ready", "/docs", "/openapi.json"}
+
+class BootstrapGateMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or bootstrap_state["done"]
+                or scope["path"] in BOOTSTRAP_EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": "Service is starting, please retry shortly"},
+            status_code=503,
+            headers={"Retry-After": "5"},
+        )
+        await response(scope, receive, send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(bootstrap())
+    yield
+    task.cancel()
+    # Before the engines go away: pending reactions are written on the way out
+    await run_in_threadpool(reaction_buffer.shutdown)
+    broker.stop()
+    hashing.shutdown()
+    await dispose_async_engine()
+
+app = FastAPI(title="BragBoard API", version="1.0.0", lifespan=lifespan)
 
 # origins = ["http://localhost:3000"]
 # origins = ["https://bragboard-frontend.vercel.app"]
@@ -19,6 +82,9 @@ origins = [
     "https://bragboard-frontend.vercel.app",
 ]
 
+# Added before CORS, so the 503s it sends still carry CORS headers
+app.add_middleware(BootstrapGateMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -28,6 +94,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Query count and DB time per request (JSON log line, optional Server-Timing header)
+if QUERY_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+
 
 @app.get("/")
 def read_root():
@@ -42,6 +112,76 @@ def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         return {"status": "unhealthy", "database": str(e)}
 
+@app.get("/ready")
+def readiness_check(response: Response):
+    # Readiness, unlike /health: 503 until startup migrations ran and while the DB is unreachable
+    if not bootstrap_state["done"]:
+        response.status_code = 503
+        return {"status": "starting", "error": bootstrap_state["error"]}
+    try:
+        check_connection()
+    except Exception as e:
+        response.status_code = 503
+        return {"status": "unavailable", "database": str(e)}
+    return {"status": "ready"}
+
+@app.get("/metrics/db")
+def db_pool_metrics(current_user: User = Depends(get_current_user)):
+    admin.admin_required(current_user)
+    # Counters are per worker process
+    return {**pool_stats(), "replicas": replicas.router.status()}
+
+@app.get("/metrics/user-cache")
+def user_cache_metrics(current_user: User = Depends(get_current_user)):
+    admin.admin_required(current_user)
+    # Counters are per worker process
+    return user_cache.cache.stats()
+
+@app.get("/metrics/reaction-buffer")
+def reaction_buffer_metrics(current_user: User = Depends(get_current_user)):
+    admin.admin_required(current_user)
+    # Counters are per worker process
+    return reaction_buffer.buffer.stats()
+
+# -------------------- LIVE EVENTS (SSE) --------------------
+def _authenticate_stream(token: str):
+    # Short-lived session: the stream itself must not hold a DB connection
+    db = session()
+    try:
+        user = get_user_from_token(token, db)
+        return user.id, user.department
+    finally:
+        db.close()
+
+@app.get("/events/stream")
+async def event_stream(request: Request, token: str = Query(...)):
+    """
+    Server-Sent Events feed of shoutout, reaction and comment activity the
+    user is allowed to see. EventSource cannot send headers, so the access
+    token is passed as a query parameter.
+    """
+    user_id, department = await run_in_threadpool(_authenticate_stream, token)
+
+    async def stream():
+        subscriber = broker.subscribe(user_id, department)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 app.include_router(users.router)
@@ -0,0 +1,119 @@
+"""
+Idempotent schema updates for existing databases.
+
+Base.metadata.create_all only creates tables that are missing, so columns and
+indexes added to existing tables are applied here. Every statement must be safe
+to run again on every startup.
+
+Run manually with:  python migrations.py
+"""
+import logging
+from sqlalchemy import text, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+from config import MIGRATION_LOCK_TIMEOUT_MS
+from database_models import Base, SHOUTOUT_SEARCH_VECTOR
+
+logger = logging.getLogger(__name__)
+
+# Raw DDL for changes create_all cannot apply to tables that already exist
+# (new columns, generated columns, ...), as (table, column, DDL). ALTER TABLE
+# takes an ACCESS EXCLUSIVE lock even when IF NOT EXISTS makes it a no-op, so
+# each runs only when information_schema shows the column missing.
+COLUMN_MIGRATIONS = [
+    ("shoutouts", "search_vector",
+     "ALTER TABLE shoutouts ADD COLUMN IF NOT EXISTS search_vector tsvector "
+     f"GENERATED ALWAYS AS ({SHOUTOUT_SEARCH_VECTOR}) STORED"),
+    ("shoutouts", "fanned_out",
+     "ALTER TABLE shoutouts ADD COLUMN IF NOT EXISTS fanned_out boolean NOT NULL DEFAULT false"),
+    ("users", "token_version",
+     "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version integer NOT NULL DEFAULT 0"),
+    ("comments", "parent_id",
+     "ALTER TABLE comments ADD COLUMN IF NOT EXISTS parent_id integer REFERENCES comments(id) ON DELETE CASCADE"),
+    ("comments", "reply_count",
+     "ALTER TABLE comments ADD COLUMN IF NOT EXISTS reply_count integer NOT NULL DEFAULT 0"),
+    # Existing comments are all top-level: their path is their own id. Backfilled
+    # once, when the column is added, rather than scanned on every startup.
+    ("comments", "path", """
+        ALTER TABLE comments ADD COLUMN path varchar COLLATE "C";
+        UPDATE comments SET path = lpad(id::text, 10, '0');
+        ALTER TABLE comments ALTER COLUMN path SET NOT NULL
+    """),
+]
+
+EXISTING_COLUMNS = """
+SELECT table_name, column_name FROM information_schema.columns
+WHERE table_schema = current_schema()
+"""
+
+# Indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY, excluding
+# any another process is building right now
+INVALID_INDEXES = """
+SELECT c.relname FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE NOT i.indisvalid AND n.nspname = current_schema()
+  AND NOT EXISTS (SELECT 1 FROM pg_stat_progress_create_index p WHERE p.index_relid = i.indexrelid)
+"""
+
+
+def run_migrations(bind):
+    # shoutout_counters is derived data: fill it the first time it is created
+    backfill_counters = not inspect(bind).has_table("shoutout_counters")
+
+    # Schema changes may legitimately outlast DB_STATEMENT_TIMEOUT_MS, but must
+    # not wait for table locks behind live traffic: the app is already serving.
+    # A lock timeout fails the attempt and bootstrap retries it later.
+    lock_timeout = text(f"SET LOCAL lock_timeout = {MIGRATION_LOCK_TIMEOUT_MS}")
+    with bind.begin() as conn:
+        conn.execute(lock_timeout)
+        Base.metadata.create_all(bind=conn)
+
+    with bind.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(lock_timeout)
+        existing = {tuple(row) for row in conn.execute(text(EXISTING_COLUMNS))}
+        for table, column, statement in COLUMN_MIGRATIONS:
+            if (table, column) in existing:
+                continue
+            logger.info(f"Adding column {table}.{column}")
+            conn.execute(text(statement))
+
+    # Indexes declared on the models are created if missing. They are built
+    # CONCURRENTLY (outside a transaction) so large tables stay writable. A
+    # concurrent build that failed leaves an INVALID index behind, which the
+    # planner never uses: drop and rebuild those, unless a build is still running.
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        conn.execute(text(f"SET lock_timeout = {MIGRATION_LOCK_TIMEOUT_MS}"))
+        try:
+            inspector = inspect(conn)
+            invalid = set(conn.execute(text(INVALID_INDEXES)).scalars())
+            for table in Base.metadata.sorted_tables:
+                existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in invalid:
+                        logger.warning(f"Dropping invalid index {index.name}")
+                        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                    elif index.name in existing:
+                        continue
+                    ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+                    logger.info(f"Creating index {index.name}")
+                    conn.execute(text(ddl.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)))
+        finally:
+            # Back to the connection's configured timeouts before it returns to the pool
+            conn.execute(text("RESET statement_timeout"))
+            conn.execute(text("RESET lock_timeout"))
+
+    if backfill_counters:
+        from counters import rebuild_counters
+        with Session(bind=bind) as db:
+            db.execute(text("SET LOCAL statement_timeout = 0"))
+            rebuild_counters(db)
+
+    logger.info("Database schema is up to date.")
+
+
+if __name__ == "__main__":
+    from database import engine
+    run_migrations(engine)
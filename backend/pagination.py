@@ -0,0 +1,73 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+
+def encode_cursor(*values) -> str:
+    """
+    Build an opaque cursor from the sort key of the last row on a page.
+    Datetimes are stored as ISO strings and restored by decode_cursor.
+    """
+    payload = [
+        {"dt": v.isoformat()} if isinstance(v, datetime) else v
+        for v in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError("wrong cursor size")
+        return [
+            datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v
+            for v in payload
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_ids(ids: str, limit: int) -> list:
+    """Parse a comma-separated id list such as "3,1,2" (order kept, duplicates dropped)."""
+    try:
+        parsed = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(parsed) > limit:
+        raise HTTPException(status_code=400, detail=f"At most {limit} ids per request")
+    return parsed
+
+
+def keyset_page(query, columns: list, cursor, before, limit: int, key_of):
+    """
+    One page of `query` in ascending order of `columns` (unique together), in
+    either direction: `cursor` continues after a row ("" for the first page),
+    `before` goes back from one. key_of(row) returns a row's values for
+    `columns`. Returns (rows, next_cursor, prev_cursor), rows in ascending order.
+    """
+    key = tuple_(*columns)
+    if before:
+        query = query.filter(key < tuple_(*decode_cursor(before, len(columns))))
+        query = query.order_by(*[c.desc() for c in columns])
+    else:
+        if cursor:
+            query = query.filter(key > tuple_(*decode_cursor(cursor, len(columns))))
+        query = query.order_by(*columns)
+
+    # One extra row tells us whether another page exists in this direction
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+
+    first = encode_cursor(*key_of(rows[0])) if rows else None
+    last = encode_cursor(*key_of(rows[-1])) if rows else None
+    if before:
+        return rows, last or before, first if more else None
+    return rows, last if more else None, (first or cursor) if cursor else None
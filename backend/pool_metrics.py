@@ -0,0 +1,111 @@
+"""
+Connection pool instrumentation for /metrics/db.
+
+Engines are built with a QueuePool subclass that times how long each checkout
+waits for a free connection and counts checkouts that hit pool_timeout. Pool
+events count new, checked-out and invalidated connections. Numbers are per
+worker process, since every worker has its own pools.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event, exc
+
+# Upper bounds (ms) of the wait-time histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# QueuePool._do_get calls itself when it loses an overflow race; time only the outer call
+_in_checkout = ContextVar("_in_checkout", default=False)
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.pool = None
+
+    def observe_wait(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.wait_counts[bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+            self.wait_total_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+
+    def attach(self, engine):
+        """Count pool events for engine; call once after create_engine."""
+        self.pool = engine.pool
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, record):
+            self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, record, proxy):
+            self.checkouts += 1
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, record, exception):
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        waits = sum(self.wait_counts)
+        histogram = {f"le_{b}ms": c for b, c in zip(WAIT_BUCKETS_MS, self.wait_counts)}
+        histogram[f"gt_{WAIT_BUCKETS_MS[-1]}ms"] = self.wait_counts[-1]
+        return {
+            "pool_size": pool.size() if pool else None,
+            "checked_out": pool.checkedout() if pool else None,
+            "idle": pool.checkedin() if pool else None,
+            "overflow": max(pool.overflow(), 0) if pool else None,
+            "max_overflow": getattr(pool, "_max_overflow", None),
+            "timeout_seconds": getattr(pool, "_timeout", None),
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "invalidations": self.invalidations,
+            "checkout_timeouts": self.timeouts,
+            "wait": {
+                "count": waits,
+                "avg_ms": round(self.wait_total_ms / waits, 3) if waits else None,
+                "max_ms": round(self.wait_max_ms, 3),
+                "histogram": histogram,
+            },
+        }
+
+
+def instrumented_pool(pool_class, metrics: PoolMetrics):
+    """
+    Subclass pool_class so checkouts record their wait in metrics. The class
+    carries metrics, so pools recreated by engine.dispose() keep reporting.
+    """
+
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            if _in_checkout.get():
+                return super()._do_get()
+            token = _in_checkout.set(True)
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                metrics.timeouts += 1
+                raise
+            finally:
+                _in_checkout.reset(token)
+            metrics.observe_wait(time.perf_counter() - started)
+            return connection
+
+        def recreate(self):
+            new_pool = super().recreate()
+            metrics.pool = new_pool
+            return new_pool
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
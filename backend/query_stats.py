@@ -0,0 +1,171 @@
+"""
+Per-request SQL instrumentation.
+
+Cursor-execute hooks on every Engine (primary, asyncpg, replicas) add each
+statement to the QueryStats of the current context: statement count, total DB
+time and the slowest statement. QueryStatsMiddleware opens one per request and
+logs one JSON line per request on the "bragboard.requests" logger. With
+QUERY_STATS_SERVER_TIMING on it also reports the stats in a Server-Timing
+header; that hands query counts and timings to any client, so it is for
+debugging only.
+
+With N_PLUS_ONE_DETECTION on, a statement that runs N_PLUS_ONE_THRESHOLD times
+or more with different parameters in one request is logged as an N+1 pattern.
+
+query_budget() asserts a maximum statement count for a block of code, e.g. in
+check_query_plans.py:
+
+    with query_budget(3, "comments.list"):
+        comments.read_comments(db, shoutout_id)
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from config import N_PLUS_ONE_DETECTION, N_PLUS_ONE_THRESHOLD, QUERY_STATS_SERVER_TIMING
+
+logger = logging.getLogger("bragboard.requests")
+
+_current = ContextVar("query_stats", default=None)
+
+# Statements are truncated in headers and logs
+SQL_PREVIEW_CHARS = 300
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    def __init__(self, detect_n_plus_one: bool = N_PLUS_ONE_DETECTION, parent=None):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+        self.detect_n_plus_one = detect_n_plus_one
+        self.parent = parent    # enclosing QueryStats (a budget inside a request)
+        self._params = {}       # statement -> distinct parameter sets, when detecting
+
+    def record(self, statement: str, parameters, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        if ms >= self.slowest_ms:
+            self.slowest_ms, self.slowest_sql = ms, statement
+        if self.detect_n_plus_one:
+            self._params.setdefault(statement, set()).add(repr(parameters))
+        if self.parent is not None:
+            self.parent.record(statement, parameters, ms)
+
+    def n_plus_one(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+        return [
+            {"sql": _preview(statement), "executions": len(params)}
+            for statement, params in self._params.items()
+            if len(params) >= threshold
+        ]
+
+    def server_timing(self, elapsed_ms: float) -> str:
+        metrics = [
+            f'db;dur={self.total_ms:.1f};desc="{self.count} queries"',
+            f"db-slowest;dur={self.slowest_ms:.1f}",
+            f"app;dur={elapsed_ms:.1f}",
+        ]
+        return ", ".join(metrics)
+
+
+def _preview(statement: str) -> str:
+    statement = " ".join(statement.split())
+    return statement[:SQL_PREVIEW_CHARS]
+
+
+# -------------------- Engine hooks --------------------
+# Registered on the Engine class so engines created later (asyncpg, replicas) report too.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    stats.record(statement, parameters, (time.perf_counter() - started.pop()) * 1000)
+
+
+@contextmanager
+def track(detect_n_plus_one: bool = N_PLUS_ONE_DETECTION):
+    """Collect stats for every statement run in this context (threadpool calls included)."""
+    stats = QueryStats(detect_n_plus_one, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "block"):
+    """Raise QueryBudgetExceeded when the block runs more than max_queries statements."""
+    with track(detect_n_plus_one=True) as stats:
+        yield stats
+    if stats.count > max_queries:
+        repeated = "".join(f"\n  {r['executions']}x {r['sql']}" for r in stats.n_plus_one(2))
+        raise QueryBudgetExceeded(
+            f"{label} ran {stats.count} queries, budget is {max_queries}{repeated}"
+        )
+
+
+# -------------------- Middleware --------------------
+class QueryStatsMiddleware:
+    def __init__(self, app, server_timing: bool = QUERY_STATS_SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        with track() as stats:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                if message["type"] == "http.response.start" and self.server_timing:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing(elapsed_ms))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                self.log(scope, status["code"], stats, (time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def log(scope, status_code: int, stats: QueryStats, elapsed_ms: float):
+        route = scope.get("route")
+        record = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "status": status_code,
+            "duration_ms": round(elapsed_ms, 1),
+            "db_queries": stats.count,
+            "db_ms": round(stats.total_ms, 1),
+            "db_slowest_ms": round(stats.slowest_ms, 1),
+            "db_slowest_sql": _preview(stats.slowest_sql) if stats.slowest_sql else None,
+        }
+        repeated = stats.n_plus_one() if stats.detect_n_plus_one else []
+        if repeated:
+            record["n_plus_one"] = repeated
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
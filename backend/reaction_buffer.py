@@ -0,0 +1,380 @@
+"""
+Write-coalescing buffer for reactions (REACTION_BUFFER_ENABLED).
+
+A viral shoutout draws hundreds of reactions a second, and applying each one
+in its own transaction makes every reactor queue on the same counter row.
+With the buffer on, a reaction is acknowledged after a single read and kept
+in this worker's memory. A background thread writes everything pending every
+REACTION_BUFFER_FLUSH_MS in one multi-row statement.
+
+- Changes are coalesced per (shoutout, user). Only the final reaction is
+  written, and a toggle that undoes a pending one is dropped.
+- Counter deltas are computed in the flush from the rows as they are then, so
+  counts stay exact even when several workers buffer the same shoutout.
+- Reads merge the pending deltas of this worker into the counts (overlay()).
+  Other workers see a change once it is flushed.
+- Pending changes are lost if the process dies. On a clean shutdown they are
+  flushed unless REACTION_BUFFER_FLUSH_ON_SHUTDOWN is off. At most
+  REACTION_BUFFER_MAX_PENDING changes are held; beyond that the request that
+  overflows flushes first.
+"""
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import and_, text
+from sqlalchemy.orm import Session, aliased
+from config import (
+    REACTION_BUFFER_ENABLED, REACTION_BUFFER_FLUSH_MS, REACTION_BUFFER_MAX_PENDING,
+    REACTION_BUFFER_FLUSH_ON_SHUTDOWN,
+)
+from counters import reaction_column
+from database import session
+from database_models import ShoutOut, ShoutOutReaction, ShoutOutCounter, User, REACTION_TYPES
+from versioning import bump_version, SHOUTOUTS
+from visibility import visible_to
+import events
+
+logger = logging.getLogger(__name__)
+
+# Sets each (shoutout, user) pair to its reaction (NULL removes it) and applies
+# the counter deltas, for the whole batch at once. Pairs whose shoutout was
+# deleted after they were buffered are dropped, and are missing from the
+# result. `raced` has the same meaning as in routers/reactions.py: a row was
+# inserted after this statement's snapshot, so its deltas were wrong and the
+# batch is retried.
+def _counter_deltas_sql() -> dict:
+    return {
+        f"{t}_count": f"count(*) FILTER (WHERE s.current = '{t}') - count(*) FILTER (WHERE s.previous = '{t}')"
+        for t in REACTION_TYPES
+    }
+
+_DELTAS = _counter_deltas_sql()
+
+FLUSH_REACTIONS = text(f"""
+WITH changes AS (
+    SELECT c.shoutout_id, c.user_id, c.reaction_type, {", ".join(f"t.{f}" for f in events.AUDIENCE_FIELDS)}
+    FROM unnest(CAST(:shoutout_ids AS integer[]), CAST(:user_ids AS integer[]),
+                CAST(:reaction_types AS varchar[])) AS c(shoutout_id, user_id, reaction_type)
+    JOIN shoutouts t ON t.id = c.shoutout_id AND NOT t.is_deleted
+),
+previous AS (
+    SELECT r.shoutout_id, r.user_id, r.reaction_type FROM shoutout_reactions r
+    JOIN changes c ON c.shoutout_id = r.shoutout_id AND c.user_id = r.user_id
+    FOR UPDATE OF r
+),
+removed AS (
+    DELETE FROM shoutout_reactions r USING changes c
+    WHERE r.shoutout_id = c.shoutout_id AND r.user_id = c.user_id AND c.reaction_type IS NULL
+),
+upserted AS (
+    INSERT INTO shoutout_reactions (shoutout_id, user_id, reaction_type, created_at, is_deleted)
+    SELECT shoutout_id, user_id, reaction_type, :now, false FROM changes
+    WHERE reaction_type IS NOT NULL
+    ON CONFLICT ON CONSTRAINT unique_user_shoutout_reaction DO UPDATE
+        SET reaction_type = EXCLUDED.reaction_type, created_at = EXCLUDED.created_at
+        WHERE shoutout_reactions.reaction_type IS DISTINCT FROM EXCLUDED.reaction_type
+    RETURNING shoutout_id, user_id, (xmax = 0) AS inserted
+),
+state AS (
+    SELECT c.*, p.reaction_type AS previous, c.reaction_type AS current,
+        p.user_id IS NULL AND c.reaction_type IS NOT NULL AND NOT COALESCE(u.inserted, false) AS raced
+    FROM changes c
+    LEFT JOIN previous p ON p.shoutout_id = c.shoutout_id AND p.user_id = c.user_id
+    LEFT JOIN upserted u ON u.shoutout_id = c.shoutout_id AND u.user_id = c.user_id
+),
+deltas AS (
+    SELECT s.shoutout_id, {", ".join(f"{d} AS {col}" for col, d in _DELTAS.items())}
+    FROM state s WHERE s.previous IS DISTINCT FROM s.current
+    GROUP BY s.shoutout_id
+),
+counted AS (
+    INSERT INTO shoutout_counters AS c (shoutout_id, {", ".join(_DELTAS)})
+    SELECT shoutout_id, {", ".join(f"GREATEST({col}, 0)" for col in _DELTAS)} FROM deltas
+    ON CONFLICT (shoutout_id) DO UPDATE SET
+        {", ".join(f"{col} = c.{col} + (SELECT d.{col} FROM deltas d WHERE d.shoutout_id = EXCLUDED.shoutout_id)"
+                   for col in _DELTAS)}
+)
+SELECT * FROM state
+""")
+
+RACE_RETRIES = 3
+
+
+def _deltas(entries: dict) -> Counter:
+    """Reaction type -> count change for one shoutout's {user_id: [previous, target]} entries."""
+    deltas = Counter()
+    for previous, target in entries.values():
+        if previous is not None:
+            deltas[previous] -= 1
+        if target is not None:
+            deltas[target] += 1
+    return deltas
+
+
+class ReactionBuffer:
+    def __init__(self, flush_seconds: float, max_pending: int):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        # shoutout_id -> {user_id: [previous, target]}; previous is what the
+        # database held before this worker's first buffered change to the pair
+        self._pending = {}
+        self._flushing = {}     # the batch being written; still merged into reads
+        self._size = 0
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+        # Bumped before and after every flush commit, so it is odd while one is
+        # in flight. A read that overlapped a commit is repeated.
+        self.generation = 0
+        self.flushes = 0
+        self.written = 0
+        self.coalesced = 0
+        self.deferred = 0       # raced on every retry; put back for the next flush
+        self.dropped = 0        # shoutout deleted before the flush
+        self.failures = 0
+
+    # ---------- request threads ----------
+    def apply(self, db: Session, user: User, changes: list, toggle: bool) -> list:
+        """
+        Buffer (shoutout_id, reaction_type) changes for one user. Same contract
+        as routers.reactions.apply_reactions: one result per change, None for
+        shoutouts that do not exist, are deleted or are hidden from the user.
+        """
+        for change in changes:
+            if change[1] is not None:
+                reaction_column(change[1])
+        self._ensure_flusher()
+        if self._size >= self.max_pending:
+            self.flush()
+
+        shoutout_ids = list(dict.fromkeys(shoutout_id for shoutout_id, _ in changes))
+        while True:
+            with self._lock:
+                # The rows of a commit in flight may or may not be visible yet
+                while self.generation % 2:
+                    self._committed.wait()
+                seen = self.generation
+            state = _current_state(db, user, shoutout_ids)
+            with self._lock:
+                if seen != self.generation:
+                    continue
+                return [self._record(state, user.id, shoutout_id, reaction_type, toggle)
+                        for shoutout_id, reaction_type in changes]
+
+    def _record(self, state: dict, user_id: int, shoutout_id: int, reaction_type, toggle: bool):
+        # Runs under self._lock
+        if shoutout_id not in state:
+            return None
+        stored, counts = state[shoutout_id]
+        entry = self._pending.get(shoutout_id, {}).get(user_id)
+        flushing = self._flushing.get(shoutout_id, {}).get(user_id)
+        if entry:
+            current = entry[1]
+        elif flushing:
+            current = flushing[1]
+        else:
+            current = stored
+
+        target = None if toggle and reaction_type == current else reaction_type
+        if entry:
+            self.coalesced += 1
+            entry[1] = target
+            if entry[0] == target:
+                del self._pending[shoutout_id][user_id]
+                self._size -= 1
+                if not self._pending[shoutout_id]:
+                    del self._pending[shoutout_id]
+        elif target != current:
+            self._pending.setdefault(shoutout_id, {})[user_id] = [current, target]
+            self._size += 1
+
+        return {
+            "shoutout_id": shoutout_id,
+            "previous": current,
+            "my_reaction": target,
+            "counts": self._overlay_counts(shoutout_id, counts),
+        }
+
+    def overlay(self, shoutout_id: int, user_id: int, counts: dict, my_reaction):
+        """Merge this worker's unflushed changes into counts read from the database."""
+        with self._lock:
+            for batch in (self._flushing, self._pending):
+                entry = batch.get(shoutout_id, {}).get(user_id)
+                if entry:
+                    my_reaction = entry[1]
+            return self._overlay_counts(shoutout_id, counts), my_reaction
+
+    def _overlay_counts(self, shoutout_id: int, counts: dict) -> dict:
+        counts = dict(counts)
+        for batch in (self._flushing, self._pending):
+            for reaction_type, delta in _deltas(batch.get(shoutout_id, {})).items():
+                counts[reaction_type] = max(counts.get(reaction_type, 0) + delta, 0)
+        return counts
+
+    # ---------- flushing ----------
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher and self._flusher.is_alive():
+                return
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="reaction-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every pending change in one transaction; returns the number of rows changed."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+                self._size = 0
+
+            batch = [
+                (shoutout_id, user_id, target)
+                for shoutout_id, entries in self._flushing.items()
+                for user_id, (_, target) in entries.items()
+            ]
+            db = session()
+            committing = False
+            try:
+                changed, deferred = self._write(db, batch)
+                # Requests reading during the commit retry once it is done, so
+                # none counts the committed rows and the batch's in-memory deltas
+                # together; the lock is not held across the commit itself
+                with self._lock:
+                    self.generation += 1
+                committing = True
+                db.commit()
+                with self._lock:
+                    self._requeue(deferred)
+                    self.flushes += 1
+                    self.written += changed
+                return changed
+            except Exception as e:
+                db.rollback()
+                self.failures += 1
+                logger.error(f"Reaction flush of {len(batch)} changes failed, keeping them pending: {e}")
+                with self._lock:
+                    self._requeue()
+                return 0
+            finally:
+                db.close()
+                if committing:
+                    with self._lock:
+                        self._flushing = {}
+                        self.generation += 1
+                        self._committed.notify_all()
+
+    def _write(self, db: Session, batch: list):
+        """
+        Run the batch, leaving the transaction open. Returns the number of rows
+        changed and the (shoutout_id, user_id) pairs left out because they
+        raced on every retry; the caller puts those back in pending.
+        """
+        deferred, attempt = set(), 0
+        while True:
+            rows = db.execute(FLUSH_REACTIONS, {
+                "shoutout_ids": [b[0] for b in batch],
+                "user_ids": [b[1] for b in batch],
+                "reaction_types": [b[2] for b in batch],
+                "now": datetime.utcnow(),
+            }).mappings().all()
+            raced = {(row["shoutout_id"], row["user_id"]) for row in rows if row["raced"]}
+            if not raced:
+                break
+            db.rollback()
+            attempt += 1
+            if attempt >= RACE_RETRIES:
+                # Committing would apply their stale deltas; write the rest now
+                deferred |= raced
+                batch = [b for b in batch if (b[0], b[1]) not in raced]
+
+        self.dropped += len(batch) - len(rows)
+        self.deferred += len(deferred)
+        changed = [row for row in rows if row["previous"] != row["current"]]
+        by_shoutout = {}
+        for row in changed:
+            by_shoutout.setdefault(row["shoutout_id"], []).append(row)
+        # One event per shoutout and flush; clients refetch the counts
+        for shoutout_id, shoutout_rows in by_shoutout.items():
+            first = shoutout_rows[0]
+            actors = {row["user_id"] for row in shoutout_rows}
+            shoutout = ShoutOut(id=shoutout_id, **{f: first[f] for f in events.AUDIENCE_FIELDS})
+            events.publish(db, "reaction", shoutout, actors.pop() if len(actors) == 1 else None,
+                           reactions=len(shoutout_rows))
+        if changed:
+            bump_version(db, SHOUTOUTS)
+        return len(changed), deferred
+
+    def _requeue(self, pairs=None):
+        # Runs under self._lock. Puts the flushing batch, or just the given
+        # (shoutout_id, user_id) pairs, back in pending. Newer changes to a pair
+        # keep their target but start from the batch's previous value.
+        for shoutout_id, entries in self._flushing.items():
+            pending = self._pending.setdefault(shoutout_id, {})
+            for user_id, (previous, target) in entries.items():
+                if pairs is not None and (shoutout_id, user_id) not in pairs:
+                    continue
+                if user_id in pending:
+                    pending[user_id][0] = previous
+                else:
+                    pending[user_id] = [previous, target]
+                    self._size += 1
+            if not pending:
+                del self._pending[shoutout_id]
+        self._flushing = {}
+
+    def stop(self, flush: bool = True):
+        self._stop.set()
+        if self._flusher:
+            self._flusher.join(timeout=self.flush_seconds * 2 + 5)
+        if flush:
+            self.flush()
+        elif self._size:
+            logger.warning(f"Discarding {self._size} unflushed reaction changes on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": REACTION_BUFFER_ENABLED,
+            "pending": self._size,
+            "flushes": self.flushes,
+            "written": self.written,
+            "coalesced": self.coalesced,
+            "deferred": self.deferred,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+def _current_state(db: Session, user: User, shoutout_ids: list) -> dict:
+    """shoutout_id -> (user's reaction, counts) as stored, in one query; only shoutouts the user may react to."""
+    mine = aliased(ShoutOutReaction)
+    rows = (
+        db.query(ShoutOut.id, ShoutOutCounter, mine.reaction_type)
+        .outerjoin(ShoutOutCounter, ShoutOutCounter.shoutout_id == ShoutOut.id)
+        .outerjoin(mine, and_(mine.shoutout_id == ShoutOut.id, mine.user_id == user.id))
+        .filter(ShoutOut.id.in_(shoutout_ids), ShoutOut.is_deleted == False, visible_to(user))
+        .all()
+    )
+    # Read-only; end the transaction so the connection is not held idle in it
+    db.rollback()
+    return {
+        shoutout_id: (reaction_type, counters.reaction_counts() if counters else {t: 0 for t in REACTION_TYPES})
+        for shoutout_id, counters, reaction_type in rows
+    }
+
+
+buffer = ReactionBuffer(REACTION_BUFFER_FLUSH_MS / 1000, REACTION_BUFFER_MAX_PENDING)
+
+
+def shutdown():
+    """Stop the flush thread; pending changes are written unless configured otherwise."""
+    if REACTION_BUFFER_ENABLED:
+        buffer.stop(flush=REACTION_BUFFER_FLUSH_ON_SHUTDOWN)
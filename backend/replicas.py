@@ -0,0 +1,236 @@
+"""
+Read-replica routing for read-only endpoints.
+
+With DATABASE_REPLICA_URLS set, routes that depend on get_read_db (sync) or
+get_async_read_db (async) are served round-robin from replicas; everything
+else keeps using the primary. A background thread checks every replica each
+REPLICA_CHECK_SECONDS; one that fails the check or replays more than
+REPLICA_MAX_LAG_SECONDS behind is left out until it recovers. With no healthy
+replica, reads go to the primary.
+
+Read-your-writes: when a request by an authenticated user commits a write on
+the primary, that user's reads stick to the primary for
+READ_YOUR_WRITES_SECONDS. The commit NOTIFYs every worker, so the user sticks
+no matter which worker serves the next request.
+
+For local testing, point DATABASE_REPLICA_URLS at a second Postgres instance
+(a streaming standby, or any copy of the schema).
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Depends
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from auth import get_current_user
+from config import (
+    DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_SECONDS, READ_YOUR_WRITES_SECONDS,
+    REPLICA_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, ASYNC_DB_ENABLED,
+)
+from database import session, get_async_db, async_database_url
+from events import broker
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "bragboard_read_your_writes"
+
+# Seconds of replay lag; 0 when the standby has replayed everything it received
+# (so an idle primary does not look like lag). NULL off a standby, hence 0.
+LAG_QUERY = text("""
+    SELECT COALESCE(CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END, 0)
+""")
+
+
+class Replica:
+    def __init__(self, url: str, index: int):
+        self.url = url
+        self.name = f"replica-{index}"
+        self.engine = create_engine(
+            url,
+            pool_size=REPLICA_POOL_SIZE,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+        self.session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._async_session = None
+        self.healthy = False
+        self.lag_seconds = None
+        self.last_error = None
+        self.checked_at = None
+
+    def async_session(self):
+        if self._async_session is None:
+            url, connect_args = async_database_url(self.url)
+            async_engine = create_async_engine(
+                url,
+                connect_args=connect_args,
+                pool_size=REPLICA_POOL_SIZE,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=True,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+            self._async_session = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        return self._async_session()
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                self.lag_seconds = float(conn.execute(LAG_QUERY).scalar())
+            self.last_error = None
+            healthy = self.lag_seconds <= REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            self.lag_seconds, self.last_error = None, str(e)
+            healthy = False
+        if healthy != self.healthy:
+            logger.warning(f"{self.name} {'back in' if healthy else 'out of'} rotation "
+                           f"(lag={self.lag_seconds}, error={self.last_error})")
+        self.healthy = healthy
+        self.checked_at = time.time()
+
+
+class ReplicaRouter:
+    def __init__(self, urls: list):
+        self.replicas = [Replica(url, i) for i, url in enumerate(urls)]
+        self._next = itertools.count()
+        # user id -> monotonic time the primary pin ends. Every pin lasts
+        # READ_YOUR_WRITES_SECONDS, so pin order is also expiry order
+        self._sticky = OrderedDict()
+        self._sticky_lock = threading.Lock()
+        self._checker = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self, user_id: int = None):
+        """A healthy replica for this reader, or None to use the primary."""
+        if not self.replicas or self.is_sticky(user_id):
+            return None
+        self._ensure_checker()
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    # ---------- read-your-writes ----------
+    def stick(self, user_id: int):
+        now = time.monotonic()
+        with self._sticky_lock:
+            self._sticky.pop(user_id, None)
+            self._sticky[user_id] = now + READ_YOUR_WRITES_SECONDS
+            # Drop expired pins from the front, so users who never read again do not accumulate
+            while self._sticky:
+                oldest, until = next(iter(self._sticky.items()))
+                if until >= now:
+                    break
+                del self._sticky[oldest]
+
+    def is_sticky(self, user_id: int) -> bool:
+        until = self._sticky.get(user_id)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            with self._sticky_lock:
+                self._sticky.pop(user_id, None)
+            return False
+        return True
+
+    # ---------- health ----------
+    def _ensure_checker(self):
+        with self._lock:
+            if self._checker and self._checker.is_alive():
+                return
+            broker.ensure_listener()
+            self._checker = threading.Thread(target=self._check_loop, name="replica-health", daemon=True)
+            self._checker.start()
+
+    def _check_loop(self):
+        while True:
+            for replica in self.replicas:
+                replica.check()
+            time.sleep(REPLICA_CHECK_SECONDS)
+
+    def status(self) -> list:
+        return [
+            {"name": r.name, "healthy": r.healthy, "lag_seconds": r.lag_seconds,
+             "last_error": r.last_error, "checked_at": r.checked_at}
+            for r in self.replicas
+        ]
+
+
+router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+# -------------------- Dependencies --------------------
+def get_read_db(current_user=Depends(get_current_user)):
+    replica = router.pick(current_user.id)
+    db = replica.session() if replica else session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(current_user=Depends(get_current_user)):
+    replica = router.pick(current_user.id) if ASYNC_DB_ENABLED else None
+    if replica is None:
+        async for db in get_async_db():
+            yield db
+        return
+    async with replica.async_session() as db:
+        yield db
+
+
+# -------------------- Write tracking on the primary --------------------
+# get_current_user records the user on the request's primary session; a commit
+# that wrote anything pins that user to the primary on every worker.
+@event.listens_for(session, "after_flush")
+def _flushed(db, flush_context):
+    db.info["wrote"] = True
+
+
+@event.listens_for(session, "do_orm_execute")
+def _executed(state):
+    if not state.is_select:
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(session, "before_commit")
+def _announce_write(db):
+    # Pending objects are flushed after this hook runs, so count them too
+    wrote = db.info.pop("wrote", False) or bool(db.new or db.dirty or db.deleted)
+    user_id = db.info.get("user_id")
+    if router.enabled and user_id and wrote:
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": str(user_id)})
+        db.info.pop("wrote", None)
+        db.info["stick"] = True
+
+
+@event.listens_for(session, "after_rollback")
+def _rolled_back(db):
+    db.info.pop("wrote", None)
+    db.info.pop("stick", None)
+
+
+@event.listens_for(session, "after_commit")
+def _stick_writer(db):
+    if db.info.pop("stick", False):
+        router.stick(db.info["user_id"])
+
+
+def _on_notify(payload: str):
+    try:
+        router.stick(int(payload))
+    except ValueError:
+        pass
+
+
+broker.on(CHANNEL, _on_notify)
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from database import get_db
+from database import get_db, run_db
+from replicas import get_async_read_db
 from database_models import User, ShoutOut,Comment
 from auth import get_current_user
+from versioning import make_etag, not_modified, SHOUTOUTS, USERS
 from sqlalchemy import func,text,cast,Date,literal_column
 from datetime import datetime, timedelta,date
 from database_models import User, ShoutOut, ShoutOutReaction, Comment,ShoutOutTag
@@ -45,11 +48,13 @@ def get_user_achievements(db: Session = Depends(get_db), current_user: User = De
     # Comments 
     comments_given = db.query(func.count(Comment.id)).join(ShoutOut).filter(
     Comment.user_id == current_user.id,
+    Comment.is_deleted == False,
     ShoutOut.is_deleted == False
     ).scalar()
 
     comments_received = db.query(func.count(Comment.id)).join(ShoutOut).filter(
         ShoutOut.receiver_id == current_user.id,
+        Comment.is_deleted == False,
         ShoutOut.is_deleted == False
     ).scalar()
 
@@ -147,11 +152,21 @@ def get_user_achievements(db: Session = Depends(get_db), current_user: User = De
 
 # -------------------- LEADERBOARD --------------------
 @router.get("/leaderboard", response_model=dict)
-def get_leaderboard(
-    db: Session = Depends(get_db),
+async def get_leaderboard(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_user),
     top_n: int = 5
 ):
+    return await run_db(db, read_leaderboard, request, response, current_user, top_n)
+
+def read_leaderboard(db: Session, request: Request, response: Response, current_user: User, top_n: int):
+    etag = make_etag(db, [SHOUTOUTS, USERS], current_user.department, top_n)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
     # ----------------- Subqueries -----------------
     sent_sq = db.query(
         ShoutOut.giver_id.label("user_id"),
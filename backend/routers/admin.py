@@ -1,20 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session, aliased
 from database import get_db
+from replicas import get_read_db
 from database_models import User, ShoutOut, ShoutOutTag, ShoutOutReport, Comment, ShoutOutReaction
 from auth import get_current_user
+from counters import reset_counters
+import timeline
+import comment_threads
+from versioning import bump_version, make_etag, not_modified, SHOUTOUTS, USERS, REPORTS
 from sqlalchemy import func, cast, Date
 from datetime import datetime, timedelta
 from fastapi.responses import StreamingResponse
 import csv
 from io import StringIO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from fastapi.responses import StreamingResponse
 from io import BytesIO
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle,Spacer, Paragraph
-from reportlab.lib import colors
 
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -27,7 +26,7 @@ def admin_required(current_user: User):
 
 #  Top Contributors
 @router.get("/top-contributors")
-def top_contributors(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def top_contributors(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     admin_required(current_user)
 
     result = db.query(
@@ -47,7 +46,7 @@ def top_contributors(db: Session = Depends(get_db), current_user: User = Depends
 
 #  Most Tagged Users
 @router.get("/most-tagged")
-def most_tagged(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def most_tagged(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     admin_required(current_user)
 
     result = db.query(
@@ -74,9 +73,14 @@ DEPARTMENTS = [
 ]
 
 @router.get("/stats")
-def admin_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def admin_stats(request: Request, response: Response, db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     admin_required(current_user)
 
+    etag = make_etag(db, [SHOUTOUTS, USERS, REPORTS])
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
     total_users = db.query(User).count()
     total_departments = len(DEPARTMENTS)
 
@@ -182,6 +186,7 @@ def resolve_report(report_id: int, db: Session = Depends(get_db), current_user:
     report.status = "resolved"
     report.updated_at = datetime.utcnow()
     report.action_taken_by = current_user.id
+    bump_version(db, REPORTS)
     db.commit()
     return {"message": "Report resolved"}
 
@@ -200,12 +205,16 @@ def admin_delete_shoutout(shoutout_id: int, db: Session = Depends(get_db), curre
 
     db.query(ShoutOutReaction).filter(ShoutOutReaction.shoutout_id == shoutout_id).update({"is_deleted": True})
 
+    reset_counters(db, shoutout_id)
+    timeline.retract(db, shout)
+
     reports = db.query(ShoutOutReport).filter(ShoutOutReport.shoutout_id == shoutout_id).all()
     for r in reports:
         r.status = "resolved"
         r.updated_at = datetime.utcnow()
         r.action_taken_by = current_user.id
 
+    bump_version(db, SHOUTOUTS, REPORTS)
     db.commit()
     return {"message": "Shoutout, its comments and reactions deleted, related reports resolved"}
 
@@ -218,13 +227,14 @@ def admin_delete_comment(comment_id: int, db: Session = Depends(get_db), current
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    comment.is_deleted = True
+    if comment_threads.delete_subtree(db, comment):
+        bump_version(db, SHOUTOUTS)
     db.commit()
     return {"message": "Comment deleted by admin"}
 
 # --- Top Departments (counts of shoutouts per department) -------
 @router.get("/top-departments")
-def top_departments(limit: int = Query(8), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def top_departments(limit: int = Query(8), db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
 
@@ -246,7 +256,7 @@ def top_departments(limit: int = Query(8), db: Session = Depends(get_db), curren
 
 # --- Activity Trend (shoutouts per day for last N days) ---
 @router.get("/activity-trend")
-def activity_trend(days: int = Query(30, ge=1, le=365), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def activity_trend(days: int = Query(30, ge=1, le=365), db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Returns shoutout counts per day for the last `days` days (default 30).
     Response: [{date: "YYYY-MM-DD", count: 3}, ...]
@@ -279,7 +289,7 @@ def activity_trend(days: int = Query(30, ge=1, le=365), db: Session = Depends(ge
 
 #-----------------csv exports----------------------
 @router.get("/export/shoutouts/csv")
-def export_shoutouts_csv(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def export_shoutouts_csv(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
 
     if not current_user.role == "admin":
         raise HTTPException(status_code=403, detail="Admin only")
@@ -307,10 +317,16 @@ def export_shoutouts_csv(db: Session = Depends(get_db), current_user: User = Dep
 
 #------------------------pdf export--------------------------
 @router.get("/export/shoutouts/pdf")
-def export_shoutouts_pdf(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def export_shoutouts_pdf(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     if not current_user.role == "admin":
         raise HTTPException(status_code=403, detail="Admin only")
 
+    # reportlab is heavy to import and only needed here
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer, Paragraph
+    from reportlab.lib import colors
+
     # Fetch data
     shoutouts = db.query(ShoutOut).filter(ShoutOut.is_deleted == False).all()
     top_contributors = db.query(User).join(ShoutOut, ShoutOut.giver_id == User.id)\
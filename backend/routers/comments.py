@@ -1,30 +1,183 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import Dict, Optional, Union
 
-from database import get_db
-from database_models import Comment, User
-from schemas import CommentCreate, CommentResponse
+from database import get_db, get_async_db, run_db
+from database_models import Comment, User, ShoutOut, ShoutOutCounter
+from schemas import CommentCreate, CommentResponse, CommentPreview, CommentPage
 from auth import get_current_user
+from counters import bump_counters
+from versioning import bump_version, SHOUTOUTS
+from pagination import parse_ids, keyset_page
+from visibility import visible_to
+import comment_threads
+import events
 
 router = APIRouter(prefix="/comments", tags=["Comments"])
 
-# post comment
+
+def comment_response(c: Comment, u: User) -> CommentResponse:
+    return CommentResponse(
+        id=c.id,
+        shoutout_id=c.shoutout_id,
+        user_id=u.id,
+        username=u.username,
+        department=u.department,
+        role=u.role,
+        content=c.content,
+        created_at=c.created_at,
+        edited_at=c.edited_at,
+        is_deleted=c.is_deleted,
+        parent_id=c.parent_id,
+        reply_count=c.reply_count or 0,
+        depth=comment_threads.depth(c.path),
+    )
+
+# post comment (or a reply, with parent_id)
 @router.post("/{shoutout_id}", response_model=dict)
 def add_comment(shoutout_id: int, data: CommentCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    comment = Comment(
-        shoutout_id=shoutout_id,
-        user_id=current_user.id,
-        content=data.content,
-        created_at=datetime.utcnow(),
+    shoutout = db.query(ShoutOut).filter(ShoutOut.id == shoutout_id).first()
+    if not shoutout:
+        raise HTTPException(status_code=404, detail="Shoutout not found")
+
+    parent = None
+    if data.parent_id is not None:
+        parent = db.query(Comment).filter(Comment.id == data.parent_id, Comment.is_deleted == False).first()
+        if not parent:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        if parent.shoutout_id != shoutout_id:
+            raise HTTPException(status_code=400, detail="Replies must be on the same shoutout")
+
+    comment = comment_threads.new_comment(
+        db, shoutout_id, current_user.id, data.content, datetime.utcnow(), parent=parent
     )
-    db.add(comment)
+    bump_counters(db, shoutout_id, {"comment_count": 1})
+    bump_version(db, SHOUTOUTS)
+    events.publish(db, "comment_added", shoutout, current_user.id)
     db.commit()
-    return {"message": "Comment added successfully"}
+    return {"message": "Comment added successfully", "id": comment.id}
+
+# preview: latest n comments for many shoutouts
+MAX_PREVIEW_IDS = 100
+
+@router.get("/preview", response_model=Dict[int, CommentPreview])
+async def get_comment_previews(
+    ids: str = Query(..., description="Comma-separated shoutout ids"),
+    n: int = Query(3, ge=1, le=20),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Latest n comments and the comment total per shoutout, in one query for all ids."""
+    return await run_db(db, read_comment_previews, parse_ids(ids, MAX_PREVIEW_IDS), n, current_user)
+
+def read_comment_previews(db: Session, shoutout_ids: list, n: int, current_user: User):
+    if not shoutout_ids:
+        return {}
+
+    visible = (
+        select(ShoutOut.id)
+        .where(ShoutOut.id.in_(shoutout_ids), ShoutOut.is_deleted == False, visible_to(current_user))
+        .subquery()
+    )
+    ranked = (
+        select(
+            Comment.id,
+            Comment.shoutout_id,
+            func.row_number().over(
+                partition_by=Comment.shoutout_id,
+                order_by=(Comment.created_at.desc(), Comment.id.desc()),
+            ).label("rank"),
+        )
+        .where(Comment.shoutout_id.in_(select(visible.c.id)), Comment.is_deleted == False)
+        .subquery()
+    )
+    rows = (
+        db.query(visible.c.id, ShoutOutCounter.comment_count, Comment, User)
+        .outerjoin(ShoutOutCounter, ShoutOutCounter.shoutout_id == visible.c.id)
+        .outerjoin(ranked, and_(ranked.c.shoutout_id == visible.c.id, ranked.c.rank <= n))
+        .outerjoin(Comment, Comment.id == ranked.c.id)
+        .outerjoin(User, User.id == Comment.user_id)
+        .order_by(visible.c.id, Comment.created_at, Comment.id)
+        .all()
+    )
+
+    previews = {}
+    for shoutout_id, total, c, u in rows:
+        preview = previews.setdefault(shoutout_id, {"total": total or 0, "comments": []})
+        if c is not None:
+            preview["comments"].append(comment_response(c, u))
+    return previews
+
+# one thread: a comment and every reply below it, depth-first
+@router.get("/thread/{comment_id}", response_model=CommentPage)
+async def get_thread(
+    comment_id: int,
+    cursor: str = "",
+    before: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The comment and its replies in thread order (each reply right after its
+    parent). Long threads are paged: next_cursor continues, prev_cursor goes back.
+    """
+    return await run_db(db, read_thread, comment_id, cursor, before, limit, current_user)
+
+def read_thread(db: Session, comment_id: int, cursor: str, before: Optional[str], limit: int, current_user: User):
+    # The subtree is one range of paths, read from ix_comments_path
+    root_path = select(Comment.path).where(Comment.id == comment_id, Comment.is_deleted == False).scalar_subquery()
+    query = (
+        db.query(Comment, User)
+        .join(User, Comment.user_id == User.id)
+        .join(ShoutOut, ShoutOut.id == Comment.shoutout_id)
+        .filter(
+            Comment.path >= root_path,
+            Comment.path < func.concat(root_path, "/"),
+            Comment.is_deleted == False,
+            ShoutOut.is_deleted == False,
+            visible_to(current_user),
+        )
+    )
+    rows, next_cursor, prev_cursor = keyset_page(
+        query, [Comment.path], cursor, before, limit, lambda row: (row[0].path,)
+    )
+    # The first page starts with the comment itself
+    if not rows and not cursor and not before:
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    return CommentPage(
+        items=[comment_response(c, u) for c, u in rows],
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+    )
 
 # get comments
-@router.get("/{shoutout_id}", response_model=list[CommentResponse])
-def get_comments(shoutout_id: int, db: Session = Depends(get_db)):
+@router.get("/{shoutout_id}", response_model=Union[CommentPage, list[CommentResponse]])
+async def get_comments(
+    shoutout_id: int,
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Two modes:
+    - legacy: no cursor, returns every live comment and reply, oldest first
+    - keyset: pass `cursor` ("" for the first page) or `before`; returns a page
+      of top-level comments with their reply_count, oldest first, plus
+      next_cursor and prev_cursor to move in either direction. Replies are
+      loaded per thread from /comments/thread/{comment_id}.
+    """
+    if cursor is None and before is None:
+        return await run_db(db, read_comments, shoutout_id)
+    return await run_db(db, read_comment_page, shoutout_id, cursor, before, limit, current_user)
+
+def read_comments(db: Session, shoutout_id: int):
     # join Comment + User so we can include user fields
     rows = (
         db.query(Comment, User)
@@ -34,54 +187,56 @@ def get_comments(shoutout_id: int, db: Session = Depends(get_db)):
         .all()
     )
 
-    result = []
-    for c, u in rows:
-        result.append(
-            CommentResponse(
-                id=c.id,
-                shoutout_id=c.shoutout_id,
-                user_id=u.id,
-                username=u.username,
-                department=u.department,
-                role=u.role,
-                content=c.content,
-                created_at=c.created_at,
-                edited_at=c.edited_at,
-                is_deleted=c.is_deleted
-            )
-        )
+    return [comment_response(c, u) for c, u in rows]
 
-    return result
+def read_comment_page(db: Session, shoutout_id: int, cursor: Optional[str], before: Optional[str],
+                      limit: int, current_user: User):
+    query = (
+        db.query(Comment, User)
+        .join(User, Comment.user_id == User.id)
+        .join(ShoutOut, ShoutOut.id == Comment.shoutout_id)
+        .filter(
+            Comment.shoutout_id == shoutout_id,
+            Comment.parent_id == None,
+            Comment.is_deleted == False,
+            ShoutOut.is_deleted == False,
+            visible_to(current_user),
+        )
+    )
+    rows, next_cursor, prev_cursor = keyset_page(
+        query, [Comment.created_at, Comment.id], cursor, before, limit,
+        lambda row: (row[0].created_at, row[0].id),
+    )
+    return CommentPage(
+        items=[comment_response(c, u) for c, u in rows],
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+    )
 
 # update comment
 @router.put("/{comment_id}", response_model=CommentResponse)
 def update_comment(comment_id: int, data: CommentCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
-    if not comment:
+    # The author comes with the comment, so the response needs no second query
+    row = (
+        db.query(Comment, User)
+        .join(User, Comment.user_id == User.id)
+        .filter(Comment.id == comment_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Comment not found")
+    comment, author = row
 
     if comment.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not allowed")
 
     comment.content = data.content
     comment.edited_at = datetime.utcnow()
+    # Built before commit, which would expire the loaded attributes
+    response = comment_response(comment, author)
+    bump_version(db, SHOUTOUTS)
     db.commit()
-    db.refresh(comment)
-
-    user = db.query(User).filter(User.id == comment.user_id).first()
-
-    return CommentResponse(
-        id=comment.id,
-        shoutout_id=comment.shoutout_id,
-        user_id=user.id,
-        username=user.username,
-        department=user.department,
-        role=user.role,
-        content=comment.content,
-        created_at=comment.created_at,
-        edited_at=comment.edited_at,
-        is_deleted=comment.is_deleted
-    )
+    return response
 
 # delete comment
 @router.delete("/{comment_id}", response_model=dict)
@@ -99,6 +254,8 @@ def delete_comment(
     if comment.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    comment.is_deleted = True
+    # Replies go with the comment they answer
+    if comment_threads.delete_subtree(db, comment):
+        bump_version(db, SHOUTOUTS)
     db.commit()
     return {"message": "Comment deleted successfully"}
@@ -1,14 +1,196 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import String, and_, column, select, text, true, tuple_, values
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import Dict, Optional
 from auth import get_current_user
-from database import get_db
-from database_models import ShoutOut, ShoutOutReaction, User
-from schemas import AddReactionRequest, ReactionResponse, ReactionCountResponse
+from database import get_db, get_async_db, run_db
+from config import REACTION_BUFFER_ENABLED
+from database_models import ShoutOut, ShoutOutReaction, ShoutOutCounter, User, REACTION_TYPES
+from counters import reaction_column
+from versioning import bump_version, SHOUTOUTS
+from pagination import encode_cursor, decode_cursor, parse_ids
+from visibility import visible_to
+import events
+from reaction_buffer import buffer
+from schemas import VisibilityEnum, AddReactionRequest, BulkReactionRequest, ReactionResponse, ReactionCountResponse
 
 router = APIRouter(prefix="/reactions", tags=["Reactions"])
 
+# -------------------- Writes --------------------
+# One statement per change: lock and read the user's current reaction, delete
+# or upsert it, and apply the matching counter deltas. Toggle mode removes the
+# reaction when it already has the requested type; set mode makes the requested
+# type (None = no reaction) the user's reaction. Shoutouts that are deleted or
+# that the user may not see match no target and change nothing.
+#
+# A user's reaction rows are only written by that user, so their requests take
+# USER_LOCK first and run one at a time. `raced` is true when a row was still
+# inserted after this statement's snapshot (by the reaction buffer's flush);
+# the previous state (and so the counter deltas) was then wrong and the caller
+# retries in a new transaction.
+def _counter_deltas_sql() -> dict:
+    return {
+        f"{t}_count": f"(s.current IS NOT DISTINCT FROM '{t}')::int - (s.previous IS NOT DISTINCT FROM '{t}')::int"
+        for t in REACTION_TYPES
+    }
+
+_DELTAS = _counter_deltas_sql()
+
+APPLY_REACTION = text(f"""
+WITH target AS (
+    -- visibility.visible_to, for the viewer in :user_id / :department
+    SELECT {", ".join(events.AUDIENCE_FIELDS)} FROM shoutouts
+    WHERE id = :shoutout_id AND NOT is_deleted
+      AND (
+          is_public = '{VisibilityEnum.public.value}'
+          OR :user_id IN (giver_id, receiver_id)
+          OR (is_public = '{VisibilityEnum.department_only.value}'
+              AND :department IN (giver_department, receiver_department))
+      )
+),
+previous AS (
+    SELECT reaction_type FROM shoutout_reactions
+    WHERE shoutout_id = :shoutout_id AND user_id = :user_id
+    FOR UPDATE
+),
+removed AS (
+    DELETE FROM shoutout_reactions
+    WHERE shoutout_id = :shoutout_id AND user_id = :user_id
+      AND EXISTS (SELECT 1 FROM target)
+      AND EXISTS (
+          SELECT 1 FROM previous
+          WHERE (:toggle AND reaction_type = :reaction_type) OR (NOT :toggle AND :reaction_type IS NULL)
+      )
+    RETURNING reaction_type
+),
+upserted AS (
+    INSERT INTO shoutout_reactions (shoutout_id, user_id, reaction_type, created_at, is_deleted)
+    SELECT :shoutout_id, :user_id, :reaction_type, :now, false FROM target
+    WHERE :reaction_type IS NOT NULL
+      AND NOT (:toggle AND EXISTS (SELECT 1 FROM previous WHERE reaction_type = :reaction_type))
+    ON CONFLICT ON CONSTRAINT unique_user_shoutout_reaction DO UPDATE
+        SET reaction_type = EXCLUDED.reaction_type, created_at = EXCLUDED.created_at
+        WHERE shoutout_reactions.reaction_type IS DISTINCT FROM EXCLUDED.reaction_type
+    RETURNING (xmax = 0) AS inserted
+),
+state AS (
+    SELECT
+        (SELECT reaction_type FROM previous) AS previous,
+        CASE
+            WHEN EXISTS (SELECT 1 FROM removed) THEN NULL
+            WHEN EXISTS (SELECT 1 FROM upserted) THEN CAST(:reaction_type AS varchar)
+            ELSE (SELECT reaction_type FROM previous)
+        END AS current,
+        NOT EXISTS (SELECT 1 FROM previous) AND :reaction_type IS NOT NULL
+            AND NOT COALESCE((SELECT inserted FROM upserted), false) AS raced
+    FROM target
+),
+counted AS (
+    INSERT INTO shoutout_counters AS c (shoutout_id, {", ".join(_DELTAS)})
+    SELECT :shoutout_id, {", ".join(f"GREATEST({d}, 0)" for d in _DELTAS.values())}
+    FROM state s WHERE s.previous IS DISTINCT FROM s.current
+    ON CONFLICT (shoutout_id) DO UPDATE SET
+        {", ".join(f"{col} = c.{col} + (SELECT {d} FROM state s)" for col, d in _DELTAS.items())}
+    RETURNING {", ".join(_DELTAS)}
+),
+counts AS (
+    SELECT {", ".join(_DELTAS)} FROM counted
+    UNION ALL
+    SELECT {", ".join(_DELTAS)} FROM shoutout_counters
+    WHERE shoutout_id = :shoutout_id AND NOT EXISTS (SELECT 1 FROM counted)
+)
+SELECT target.*, state.*, {", ".join(f"counts.{col}" for col in _DELTAS)}
+FROM target CROSS JOIN state LEFT JOIN counts ON true
+""")
+
+RACE_RETRIES = 3
+USER_LOCK = text("SELECT pg_advisory_xact_lock(hashtext('shoutout_reactions'), :user_id)")
+MAX_BULK_CHANGES = 100
+
+
+def apply_reactions(db: Session, user: User, changes: list, toggle: bool) -> list:
+    """
+    Apply (shoutout_id, reaction_type) changes for one user in one transaction
+    and commit. Returns one result per change; shoutouts that do not exist, are
+    deleted or are hidden from the user get None. Raises 409 if concurrent
+    writers keep racing the same reactions.
+    """
+    for change in changes:
+        if change[1] is not None:
+            reaction_column(change[1])
+
+    for attempt in range(RACE_RETRIES):
+        db.execute(USER_LOCK, {"user_id": user.id})
+        now = datetime.utcnow()
+        rows = [
+            db.execute(APPLY_REACTION, {
+                "shoutout_id": shoutout_id, "user_id": user.id, "department": user.department,
+                "reaction_type": reaction_type, "toggle": toggle, "now": now,
+            }).mappings().first()
+            for shoutout_id, reaction_type in changes
+        ]
+        if not any(row and row["raced"] for row in rows):
+            break
+        db.rollback()
+    else:
+        # Committing now would apply counter deltas computed from a stale state
+        raise HTTPException(status_code=409, detail="Reaction changed concurrently, please retry.")
+
+    results, changed = [], False
+    for (shoutout_id, _), row in zip(changes, rows):
+        if row is None:
+            results.append(None)
+            continue
+        if row["previous"] != row["current"]:
+            changed = True
+            shoutout = ShoutOut(id=shoutout_id, **{f: row[f] for f in events.AUDIENCE_FIELDS})
+            events.publish(db, "reaction", shoutout, user.id, reaction_type=row["current"])
+        counts = {t: row[f"{t}_count"] or 0 for t in REACTION_TYPES}
+        results.append({
+            "shoutout_id": shoutout_id,
+            "previous": row["previous"],
+            "my_reaction": row["current"],
+            "counts": counts,
+        })
+    if changed:
+        bump_version(db, SHOUTOUTS)
+    db.commit()
+    return results
+
+
+def record_reactions(db: Session, user: User, changes: list, toggle: bool) -> list:
+    """apply_reactions, or the per-worker write buffer when REACTION_BUFFER_ENABLED."""
+    if REACTION_BUFFER_ENABLED:
+        return buffer.apply(db, user, changes, toggle)
+    return apply_reactions(db, user, changes, toggle)
+
+
+@router.post("/bulk")
+def bulk_reactions(
+    request: BulkReactionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Apply many reaction changes at once, e.g. actions queued by an offline
+    client. Each change sets the reaction (null removes it), so replaying a
+    queue is idempotent. Unknown shoutouts are reported per change.
+    """
+    if len(request.changes) > MAX_BULK_CHANGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_CHANGES} changes per request")
+
+    changes = [(c.shoutout_id, c.reaction_type) for c in request.changes]
+    results = record_reactions(db, current_user, changes, toggle=False)
+    return {
+        "results": [
+            result or {"shoutout_id": shoutout_id, "error": "ShoutOut not found."}
+            for (shoutout_id, _), result in zip(changes, results)
+        ]
+    }
+
+
 @router.post("/{shoutout_id}")
 def add_or_update_reaction(
     shoutout_id: int,
@@ -16,85 +198,171 @@ def add_or_update_reaction(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    shoutout = db.query(ShoutOut).filter(ShoutOut.id == shoutout_id).first()
-    if not shoutout:
+    """Toggle the user's reaction; returns the new state and the shoutout's counts."""
+    result = record_reactions(db, current_user, [(shoutout_id, request.reaction_type)], toggle=True)[0]
+    if result is None:
         raise HTTPException(status_code=404, detail="ShoutOut not found.")
 
-    existing_reaction = db.query(ShoutOutReaction).filter(
-        and_(
-            ShoutOutReaction.shoutout_id == shoutout_id,
-            ShoutOutReaction.user_id == current_user.id
-        )
-    ).first()
+    if result["my_reaction"] is None:
+        result["message"] = "Reaction removed."
+    else:
+        result["message"] = "Reaction added/updated successfully."
+    return result
+
+# -------------------- Reads --------------------
+MAX_SUMMARY_IDS = 100
 
-    if existing_reaction:
-        if existing_reaction.reaction_type == request.reaction_type:
-            db.delete(existing_reaction)
-            db.commit()
-            return {"message": "Reaction removed."}
+@router.get("/summary", response_model=Dict[int, ReactionCountResponse])
+async def get_reaction_summary(
+    ids: str = Query(..., description="Comma-separated shoutout ids"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Counts and my_reaction for many shoutouts in one query; unknown or hidden ids are left out."""
+    return await run_db(db, read_reaction_summary, parse_ids(ids, MAX_SUMMARY_IDS), current_user)
 
-        existing_reaction.reaction_type = request.reaction_type
-        existing_reaction.created_at = datetime.utcnow()
+def read_reaction_summary(db: Session, shoutout_ids: list, current_user: User):
+    if not shoutout_ids:
+        return {}
 
-    else:
-        new_reaction = ShoutOutReaction(
-            shoutout_id=shoutout_id,
-            user_id=current_user.id,
-            reaction_type=request.reaction_type,
-            created_at=datetime.utcnow()
-        )
-        db.add(new_reaction)
+    mine = aliased(ShoutOutReaction)
+    rows = (
+        db.query(ShoutOut.id, ShoutOutCounter, mine.reaction_type)
+        .outerjoin(ShoutOutCounter, ShoutOutCounter.shoutout_id == ShoutOut.id)
+        .outerjoin(mine, and_(mine.shoutout_id == ShoutOut.id, mine.user_id == current_user.id))
+        .filter(ShoutOut.id.in_(shoutout_ids), ShoutOut.is_deleted == False, visible_to(current_user))
+        .all()
+    )
 
-    db.commit()
-    return {"message": "Reaction added/updated successfully."}
+    summary = {}
+    for shoutout_id, counters, my_reaction in rows:
+        counts = counters.reaction_counts() if counters else {t: 0 for t in REACTION_TYPES}
+        if REACTION_BUFFER_ENABLED:
+            counts, my_reaction = buffer.overlay(shoutout_id, current_user.id, counts, my_reaction)
+        summary[shoutout_id] = {**counts, "my_reaction": my_reaction}
+    return summary
 
 @router.get("/{shoutout_id}", response_model=ReactionCountResponse)
-def get_reaction_counts(
+async def get_reaction_counts(
     shoutout_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    counts = db.query(
-        ShoutOutReaction.reaction_type,
-        func.count(ShoutOutReaction.id)
-    ).filter(
-        ShoutOutReaction.shoutout_id == shoutout_id
-    ).group_by(
-        ShoutOutReaction.reaction_type
-    ).all()
+    return await run_db(db, read_reaction_counts, shoutout_id, current_user)
 
-    reaction_data = {rtype: count for rtype, count in counts}
+def read_reaction_counts(db: Session, shoutout_id: int, current_user: User):
+    counters = db.query(ShoutOutCounter).filter(
+        ShoutOutCounter.shoutout_id == shoutout_id
+    ).first()
 
-    all_types = ["like", "love", "clap", "celebrate", "insightful", "support", "star"]
-    for t in all_types:
-        reaction_data.setdefault(t, 0)
+    counts = counters.reaction_counts() if counters else {t: 0 for t in REACTION_TYPES}
 
-    my_reaction = db.query(ShoutOutReaction).filter(
+    my_reaction = db.query(ShoutOutReaction.reaction_type).filter(
         ShoutOutReaction.shoutout_id == shoutout_id,
         ShoutOutReaction.user_id == current_user.id
-    ).first()
+    ).scalar()
+
+    if REACTION_BUFFER_ENABLED:
+        counts, my_reaction = buffer.overlay(shoutout_id, current_user.id, counts, my_reaction)
 
-    reaction_data["my_reaction"] = my_reaction.reaction_type if my_reaction else None
+    return {**counts, "my_reaction": my_reaction}
 
-    return reaction_data
+MAX_PREVIEW_USERS = 10
 
 @router.get("/{shoutout_id}/users")
-def get_reacted_users(shoutout_id: int, db: Session = Depends(get_db)):
-    reactions = db.query(
-        ShoutOutReaction.reaction_type,
-        User.username,
-        User.department,
-        User.role
-    ).join(User, User.id == ShoutOutReaction.user_id
-    ).filter(ShoutOutReaction.shoutout_id == shoutout_id).all()
-
-    result = {}
-    for reaction_type, username, department, role in reactions:
-        result.setdefault(reaction_type, []).append({
-            "username": username,
-            "department": department,
-            "role": role
-        })
+async def get_reacted_users(
+    shoutout_id: int,
+    reaction_type: Optional[str] = Query(None, alias="type", description="Page through one type; omit for the preview"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    k: int = Query(3, ge=1, le=MAX_PREVIEW_USERS),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Who reacted, newest first.
+    - preview (no `type`): {"like": {"total": 120, "users": ["Ana", ...]}, ...}
+      with the latest k names per type; enough for a tooltip
+    - page (`type=like`): {"users": [...], "next_cursor": ...}; send
+      next_cursor back for the following page
+    """
+    if reaction_type is None:
+        return await run_db(db, read_reactor_preview, shoutout_id, k, current_user)
+    reaction_column(reaction_type)
+    return await run_db(db, read_reactor_page, shoutout_id, reaction_type, cursor, limit, current_user)
 
-    return result
+def read_reactor_preview(db: Session, shoutout_id: int, k: int, current_user: User):
+    # One indexed LIMIT k scan per reaction type, joined to the counters for totals
+    types = values(column("reaction_type", String), name="types").data([(t,) for t in REACTION_TYPES])
+    latest = (
+        select(ShoutOutReaction.created_at, ShoutOutReaction.id, User.username)
+        .join(User, User.id == ShoutOutReaction.user_id)
+        .where(
+            ShoutOutReaction.shoutout_id == shoutout_id,
+            ShoutOutReaction.reaction_type == types.c.reaction_type,
+        )
+        .order_by(ShoutOutReaction.created_at.desc(), ShoutOutReaction.id.desc())
+        .limit(k)
+        .lateral("latest")
+    )
+    rows = db.execute(
+        select(types.c.reaction_type, latest.c.username, ShoutOutCounter)
+        .select_from(ShoutOut)
+        .join(types, true())
+        .outerjoin(latest, true())
+        .outerjoin(ShoutOutCounter, ShoutOutCounter.shoutout_id == ShoutOut.id)
+        .where(ShoutOut.id == shoutout_id, ShoutOut.is_deleted == False, visible_to(current_user))
+        .order_by(types.c.reaction_type, latest.c.created_at.desc(), latest.c.id.desc())
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="ShoutOut not found.")
+
+    counters = rows[0][2]
+    totals = counters.reaction_counts() if counters else {t: 0 for t in REACTION_TYPES}
+    if REACTION_BUFFER_ENABLED:
+        totals, _ = buffer.overlay(shoutout_id, current_user.id, totals, None)
+
+    preview = {}
+    for reaction_type, username, _ in rows:
+        if username is None:
+            continue
+        entry = preview.setdefault(reaction_type, {"total": 0, "users": []})
+        entry["users"].append(username)
+    for reaction_type, entry in preview.items():
+        entry["total"] = max(totals.get(reaction_type, 0), len(entry["users"]))
+    return preview
+
+def read_reactor_page(db: Session, shoutout_id: int, reaction_type: str, cursor: Optional[str],
+                      limit: int, current_user: User):
+    query = (
+        db.query(ShoutOutReaction.created_at, ShoutOutReaction.id,
+                 User.id, User.username, User.department, User.role)
+        .join(User, User.id == ShoutOutReaction.user_id)
+        .join(ShoutOut, ShoutOut.id == ShoutOutReaction.shoutout_id)
+        .filter(
+            ShoutOutReaction.shoutout_id == shoutout_id,
+            ShoutOutReaction.reaction_type == reaction_type,
+            ShoutOut.is_deleted == False,
+            visible_to(current_user),
+        )
+        .order_by(ShoutOutReaction.created_at.desc(), ShoutOutReaction.id.desc())
+    )
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        query = query.filter(
+            tuple_(ShoutOutReaction.created_at, ShoutOutReaction.id) < tuple_(last_created_at, last_id)
+        )
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
 
+    return {
+        "users": [
+            {"id": user_id, "username": username, "department": department, "role": role}
+            for _, _, user_id, username, department, role in rows
+        ],
+        "next_cursor": next_cursor,
+    }
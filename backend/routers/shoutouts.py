@@ -1,16 +1,22 @@
 # shoutouts.py
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Request, Response
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import or_, func, tuple_, cast, REAL
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
-import shutil, uuid, os
-from database import get_db
+import shutil, uuid, os, re
+from database import get_db, run_db
+from replicas import get_async_read_db
 from database_models import ShoutOut, User, ShoutOutTag, ShoutOutReaction, Comment, ShoutOutReport
 from auth import get_current_user
-from schemas import UserOut, ShoutOutCreate, ShoutOutResponse, ShoutOutUpdate, VisibilityEnum
-import cloudinary
-import cloudinary.uploader
+from visibility import visible_to
+from pagination import encode_cursor, decode_cursor
+import timeline
+import events
+import typeahead
+from versioning import bump_version, make_etag, not_modified, SHOUTOUTS, USERS, REPORTS
+from schemas import UserOut, ShoutOutCreate, ShoutOutResponse, ShoutOutUpdate, ShoutOutFeedPage, VisibilityEnum
 from config import CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET
 
 router = APIRouter(prefix="/shoutouts", tags=["shoutouts"])
@@ -31,23 +37,40 @@ router = APIRouter(prefix="/shoutouts", tags=["shoutouts"])
 
 
 # # -------------------- UPLOAD IMAGE --------------------
-cloudinary.config(
-    cloud_name=CLOUDINARY_CLOUD_NAME,
-    api_key=CLOUDINARY_API_KEY,
-    api_secret=CLOUDINARY_API_SECRET
-)
+_cloudinary_uploader = None
+
+def cloudinary_uploader():
+    """Import and configure cloudinary on the first upload instead of at startup."""
+    global _cloudinary_uploader
+    if _cloudinary_uploader is None:
+        import cloudinary
+        import cloudinary.uploader
+        cloudinary.config(
+            cloud_name=CLOUDINARY_CLOUD_NAME,
+            api_key=CLOUDINARY_API_KEY,
+            api_secret=CLOUDINARY_API_SECRET
+        )
+        _cloudinary_uploader = cloudinary.uploader
+    return _cloudinary_uploader
 
 @router.post("/upload-image")
 async def upload_image(image: UploadFile = File(...)):
-    result = cloudinary.uploader.upload(image.file)
+    result = cloudinary_uploader().upload(image.file)
     return {"image_url": result["secure_url"]}
 
 # -------------------- DASHBOARD STATS --------------------
 @router.get("/dashboard/stats")
 def get_dashboard_stats(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    etag = make_etag(db, [SHOUTOUTS, USERS], current_user.id, current_user.department)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
     total_users = db.query(User).filter(User.department == current_user.department).count()
 
     shoutouts_sent = db.query(ShoutOut).filter(
@@ -132,6 +155,9 @@ def create_shoutout(
         if tagged_user:
             db.add(ShoutOutTag(shoutout_id=new_shoutout.id, tagged_user_id=uid))
             tagged_users_objs.append(tagged_user)
+    timeline.fan_out(db, new_shoutout)
+    bump_version(db, SHOUTOUTS)
+    events.publish(db, "shoutout_created", new_shoutout, current_user.id)
     db.commit()
 
     # image_url = f"http://127.0.0.1:8000{new_shoutout.image_url}" if new_shoutout.image_url else None
@@ -175,6 +201,8 @@ def update_shoutout(
 
     # Track if any change occurs
     is_changed = False
+    old_visibility = existing.is_public
+    old_audience = events.audience(existing)
 
     # --- Compare & update simple fields ---
     for field, value in shoutout_data.dict(exclude_unset=True).items():
@@ -230,6 +258,12 @@ def update_shoutout(
     # Update edited timestamp only when something actually changed
     existing.edited_at = datetime.utcnow()
 
+    if existing.is_public != old_visibility:
+        timeline.refan(db, existing)
+
+    bump_version(db, SHOUTOUTS)
+    events.publish(db, "shoutout_updated", existing, current_user.id, previous_audience=old_audience)
+
     db.commit()
     db.refresh(existing)
 
@@ -275,25 +309,95 @@ def delete_shoutout(
         raise HTTPException(status_code=403, detail="Not authorized to delete this shoutout")
 
     shoutout.is_deleted = True
+    timeline.retract(db, shoutout)
+    bump_version(db, SHOUTOUTS)
+    events.publish(db, "shoutout_deleted", shoutout, current_user.id)
     db.commit()
 
     return {"message": "Shoutout deleted successfully"}
 
-# -------------------- FEED --------------------
-@router.get("/feed", response_model=List[ShoutOutResponse])
-def get_shoutouts_feed(
-    department: Optional[str] = Query("all"),
+# -------------------- FEED ASSEMBLY --------------------
+def build_feed_responses(shoutouts: List[ShoutOut], db: Session) -> List[ShoutOutResponse]:
+    """
+    Turn a page of shoutouts into ShoutOutResponse objects with a single
+    reactions+users lookup for the whole page. Giver, receiver, tagged users
+    and counters are expected to be eager loaded by the caller so no per-row
+    lazy loads happen here.
+    """
+    if not shoutouts:
+        return []
+
+    ids = [s.id for s in shoutouts]
+
+    reactions_by_shoutout = {}
+    reactions = (
+        db.query(ShoutOutReaction, User.username)
+        .join(User, ShoutOutReaction.user_id == User.id)
+        .filter(ShoutOutReaction.shoutout_id.in_(ids))
+        .all()
+    )
+    for reaction, username in reactions:
+        reactions_by_shoutout.setdefault(reaction.shoutout_id, []).append({
+            "id": reaction.id,
+            "user_id": reaction.user_id,
+            "reaction_type": reaction.reaction_type,
+            "created_at": reaction.created_at,
+            "username": username
+        })
+
+    results = []
+    for s in shoutouts:
+        tagged_users = [UserOut.model_validate(t.tagged_user) for t in s.tags]
+        # image_url = f"http://127.0.0.1:8000{s.image_url}" if s.image_url else None
+        image_url = s.image_url if s.image_url else None
+
+        results.append(ShoutOutResponse(
+            id=s.id,
+            giver_id=s.giver_id,
+            receiver_id=s.receiver_id,
+            title=s.title,
+            message=s.message,
+            giver_name=s.giver.username,
+            receiver_name=s.receiver.username,
+            giver_department=s.giver.department,
+            receiver_department=s.receiver.department,
+            giver_role=s.giver.role,
+            receiver_role=s.receiver.role,
+            tagged_users=tagged_users,
+            category=s.category,
+            is_public=s.is_public,
+            created_at=s.created_at,
+            edited_at=s.edited_at,
+            image_url=image_url,
+            reactions=reactions_by_shoutout.get(s.id, []),
+            comment_count=s.counters.comment_count if s.counters else 0
+        ))
+
+    return results
+
+# -------------------- SEARCH HELPERS --------------------
+def build_search_query(term: str):
+    """
+    Turn free text into a prefix-matching tsquery ("team wor" -> team:* & wor:*).
+    Returns None when the text has no searchable words.
+    """
+    words = re.findall(r"\w+", term.lower())
+    if not words:
+        return None
+    return func.to_tsquery("english", " & ".join(f"{w}:*" for w in words))
+
+
+def filtered_shoutouts_query(
+    db: Session,
+    current_user: User,
+    department: Optional[str] = "all",
     sender_id: Optional[int] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
-    search: Optional[str] = None,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, le=100),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
 ):
+    """Visible, non-deleted shoutouts with the common feed filters applied."""
     query = db.query(ShoutOut)
-    query = query.filter(ShoutOut.is_deleted == False)
+    query = query.filter(ShoutOut.is_deleted == False, visible_to(current_user))
 
     if department != "all":
         query = query.filter(
@@ -306,132 +410,230 @@ def get_shoutouts_feed(
         query = query.filter(ShoutOut.created_at >= date_from)
     if date_to:
         query = query.filter(ShoutOut.created_at <= date_to)
+
+    return query.options(
+        joinedload(ShoutOut.giver),
+        joinedload(ShoutOut.receiver),
+        joinedload(ShoutOut.counters),
+        selectinload(ShoutOut.tags).joinedload(ShoutOutTag.tagged_user),
+    )
+
+# -------------------- FEED --------------------
+@router.get("/feed", response_model=Union[List[ShoutOutResponse], ShoutOutFeedPage])
+async def get_shoutouts_feed(
+    request: Request,
+    response: Response,
+    department: Optional[str] = Query("all"),
+    sender_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    search: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, le=100),
+    cursor: Optional[str] = None,
+    mode: str = Query("all", pattern="^(all|timeline)$"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    return await run_db(
+        db, read_shoutouts_feed, request, response, department, sender_id, date_from,
+        date_to, search, skip, limit, cursor, mode, current_user
+    )
+
+
+def read_shoutouts_feed(
+    db: Session,
+    request: Request,
+    response: Response,
+    department: Optional[str],
+    sender_id: Optional[int],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    search: Optional[str],
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    mode: str,
+    current_user: User
+):
+    """
+    Two pagination modes:
+    - legacy: `skip`/`limit`, returns a plain list
+    - keyset: pass `cursor` (empty for the first page), returns
+      {"items": [...], "next_cursor": ...}; send next_cursor back to continue
+
+    mode=timeline reads the unfiltered default feed from the user's
+    materialized home timeline (always keyset paged). With any filter set it
+    falls back to the regular query.
+    """
+    etag = make_etag(db, [SHOUTOUTS, USERS], current_user.id, current_user.department, request.url.query)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
+    has_filters = department != "all" or sender_id or date_from or date_to or search
+    if mode == "timeline" and not has_filters:
+        ids, next_cursor = timeline.timeline_page(db, current_user, limit, cursor)
+        # Re-applying the visibility filter drops entries that went stale
+        rows = filtered_shoutouts_query(db, current_user).filter(ShoutOut.id.in_(ids)).all() if ids else []
+        by_id = {s.id: s for s in rows}
+        shoutouts = [by_id[i] for i in ids if i in by_id]
+        return ShoutOutFeedPage(
+            items=build_feed_responses(shoutouts, db),
+            next_cursor=next_cursor
+        )
+
+    query = filtered_shoutouts_query(db, current_user, department, sender_id, date_from, date_to)
+
     if search:
-        query = query.filter(ShoutOut.message.ilike(f"%{search}%"))
+        tsquery = build_search_query(search)
+        if tsquery is None:
+            return [] if cursor is None else ShoutOutFeedPage()
+        query = query.filter(ShoutOut.search_vector.op("@@")(tsquery))
 
-    shoutouts = query.order_by(ShoutOut.created_at.desc()).offset(skip).limit(limit).all()
+    query = query.order_by(ShoutOut.created_at.desc(), ShoutOut.id.desc())
 
-    results = []
-    for s in shoutouts:
+    if cursor is None:
+        shoutouts = query.offset(skip).limit(limit).all()
+        return build_feed_responses(shoutouts, db)
 
-        comment_count = (
-          db.query(func.count(Comment.id))
-          .filter(Comment.shoutout_id == s.id, Comment.is_deleted == False)
-          .scalar()
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        query = query.filter(
+            tuple_(ShoutOut.created_at, ShoutOut.id) < tuple_(last_created_at, last_id)
         )
 
+    # One extra row tells us whether another page exists
+    shoutouts = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(shoutouts) > limit:
+        shoutouts = shoutouts[:limit]
+        last = shoutouts[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return ShoutOutFeedPage(
+        items=build_feed_responses(shoutouts, db),
+        next_cursor=next_cursor
+    )
+
+# -------------------- SEARCH --------------------
+@router.get("/search", response_model=ShoutOutFeedPage)
+def search_shoutouts(
+    q: str = Query(..., min_length=1),
+    department: Optional[str] = Query("all"),
+    sender_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(20, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over title and message, best matches first."""
+    tsquery = build_search_query(q)
+    if tsquery is None:
+        return ShoutOutFeedPage()
 
-        reactions = (
-           db.query(ShoutOutReaction, User)
-           .join(User, ShoutOutReaction.user_id == User.id)
-           .filter(ShoutOutReaction.shoutout_id == s.id)
-           .all()
+    rank = func.ts_rank(ShoutOut.search_vector, tsquery)
+    query = (
+        filtered_shoutouts_query(db, current_user, department, sender_id, date_from, date_to)
+        .add_columns(rank.label("rank"))
+        .filter(ShoutOut.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), ShoutOut.created_at.desc(), ShoutOut.id.desc())
+    )
+
+    if cursor:
+        last_rank, last_created_at, last_id = decode_cursor(cursor, 3)
+        query = query.filter(
+            tuple_(rank, ShoutOut.created_at, ShoutOut.id)
+            < tuple_(cast(last_rank, REAL), last_created_at, last_id)
         )
 
-        reactions_list = [
-            {
-               "id": reaction.id,
-               "user_id": reaction.user_id,
-               "reaction_type": reaction.reaction_type,
-               "created_at": reaction.created_at,
-               "username": user.username
-            }
-            for reaction, user in reactions
-        ]
-        # Visibility checks stay the same
-        if (
-            s.is_public == VisibilityEnum.public
-            or s.giver_id == current_user.id
-            or s.receiver_id == current_user.id
-            or (s.is_public == VisibilityEnum.department_only and (
-                s.giver_department == current_user.department
-                or s.receiver_department == current_user.department
-            ))
-        ):
-            tagged_users = [UserOut.model_validate(t.tagged_user) for t in s.tags]
-            # image_url = f"http://127.0.0.1:8000{s.image_url}" if s.image_url else None
-            image_url = s.image_url if s.image_url else None
-
-            results.append(ShoutOutResponse(
-                id=s.id,
-                giver_id=s.giver_id,
-                receiver_id=s.receiver_id,
-                title=s.title,
-                message=s.message,
-                giver_name=s.giver.username,
-                receiver_name=s.receiver.username,
-                giver_department=s.giver.department,
-                receiver_department=s.receiver.department,
-                giver_role=s.giver.role,
-                receiver_role=s.receiver.role,
-                tagged_users=tagged_users,
-                category=s.category,
-                is_public=s.is_public,
-                created_at=s.created_at,
-                edited_at=s.edited_at,
-                image_url=image_url,
-                reactions=reactions_list,
-                comment_count=comment_count
-            ))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, last_rank = rows[-1]
+        next_cursor = encode_cursor(last_rank, last.created_at, last.id)
 
-    return results
+    return ShoutOutFeedPage(
+        items=build_feed_responses([s for s, _ in rows], db),
+        next_cursor=next_cursor
+    )
 
 # -------------------- MY SHOUTOUTS --------------------
 @router.get("/my-shoutouts", response_model=dict)
 def get_my_shoutouts(
     receiver_department: Optional[str] = Query("all"),
     days: Optional[int] = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Base query - only include non-deleted shoutouts + non deleted count comments
-    query = (
-    db.query(
-        ShoutOut,
-        func.count(Comment.id).label("comment_count")
-    )
-    .outerjoin(
-        Comment,
-        (Comment.shoutout_id == ShoutOut.id) & (Comment.is_deleted == False)  
-    )
-    .filter(
+    # Base query - only include non-deleted shoutouts
+    base = db.query(ShoutOut).filter(
         or_(
             ShoutOut.giver_id == current_user.id,
             ShoutOut.receiver_id == current_user.id
         ),
         ShoutOut.is_deleted == False
     )
-    .group_by(ShoutOut.id)
-)
-
 
     # Apply department filter
     if receiver_department != "all":
-        query = query.filter(ShoutOut.receiver_department == receiver_department)
+        base = base.filter(ShoutOut.receiver_department == receiver_department)
 
     # Apply date filter
     if days is not None:
         cutoff = datetime.utcnow() - timedelta(days=days)
-        query = query.filter(ShoutOut.created_at >= cutoff)
-
-    # Fetch shoutouts sorted by edited or created date
-    shoutouts = query.order_by(
-        func.coalesce(ShoutOut.edited_at, ShoutOut.created_at).desc()
-    ).all()
+        base = base.filter(ShoutOut.created_at >= cutoff)
+
+    # Totals over the whole filtered set in one aggregate query
+    total, sent, received = base.with_entities(
+        func.count(ShoutOut.id),
+        func.count(ShoutOut.id).filter(ShoutOut.giver_id == current_user.id),
+        func.count(ShoutOut.id).filter(ShoutOut.receiver_id == current_user.id),
+    ).one()
+
+    # Page sorted by edited or created date; counts come from shoutout_counters
+    activity = func.coalesce(ShoutOut.edited_at, ShoutOut.created_at)
+    query = base.options(
+        joinedload(ShoutOut.giver),
+        joinedload(ShoutOut.receiver),
+        joinedload(ShoutOut.counters),
+        selectinload(ShoutOut.tags).joinedload(ShoutOutTag.tagged_user),
+    )
+    if cursor:
+        last_activity, last_id = decode_cursor(cursor, 2)
+        query = query.filter(tuple_(activity, ShoutOut.id) < tuple_(last_activity, last_id))
+
+    # One extra row tells us whether another page exists
+    shoutouts = query.order_by(activity.desc(), ShoutOut.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(shoutouts) > limit:
+        shoutouts = shoutouts[:limit]
+        last = shoutouts[-1]
+        next_cursor = encode_cursor(last.edited_at or last.created_at, last.id)
+
+    # The viewer's own reactions for the page in one query
+    my_reactions = {}
+    if shoutouts:
+        my_reactions = dict(
+            db.query(ShoutOutReaction.shoutout_id, ShoutOutReaction.reaction_type)
+            .filter(
+                ShoutOutReaction.user_id == current_user.id,
+                ShoutOutReaction.shoutout_id.in_([s.id for s in shoutouts])
+            )
+            .all()
+        )
 
     result = []
-    for s, comment_count in shoutouts:
-
-        # Reactions
-        reactions = db.query(ShoutOutReaction).filter(
-            ShoutOutReaction.shoutout_id == s.id
-        ).all()
-
-        reaction_counts = {}
-        for r in reactions:
-            reaction_counts[r.reaction_type] = reaction_counts.get(r.reaction_type, 0) + 1
-
-        my_reaction = next((r.reaction_type for r in reactions if r.user_id == current_user.id), None)
+    for s in shoutouts:
+        counts = s.counters.reaction_counts() if s.counters else {}
+        reaction_counts = {t: c for t, c in counts.items() if c}
+        comment_count = s.counters.comment_count if s.counters else 0
+        my_reaction = my_reactions.get(s.id)
 
         tagged_users = [UserOut.model_validate(t.tagged_user) for t in s.tags]
         # image_url = f"http://127.0.0.1:8000{s.image_url}" if s.image_url else None
@@ -462,10 +664,11 @@ def get_my_shoutouts(
         })
 
     return {
-        "total": len(result),
-        "sent": sum(1 for s, _ in shoutouts if s.giver_id == current_user.id),
-        "received": sum(1 for s, _ in shoutouts if s.receiver_id == current_user.id),
-        "shoutouts": result
+        "total": total,
+        "sent": sent,
+        "received": received,
+        "shoutouts": result,
+        "next_cursor": next_cursor
     }
 
 # -------------------- SEARCH USERS --------------------
@@ -476,20 +679,18 @@ def search_users_by_department(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(User).filter(User.id != current_user.id)
-    if department and department != "all":
-        query = query.filter(User.department == department)
-    if search:
-        query = query.filter(User.username.ilike(f"%{search}%"))
-    users = query.limit(20).all()
-
-    return [UserOut.model_validate(user) for user in users]
+    # Served from the in-process index instead of an ILIKE '%term%' table scan
+    users = typeahead.index.search(
+        db, search, department=department, exclude_id=current_user.id, limit=20
+    )
+    return [UserOut(**user) for user in users]
 
 
 @router.post("/report/{shoutout_id}")
 def report_shoutout(shoutout_id: int, reason: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     report = ShoutOutReport(shoutout_id=shoutout_id, reporter_id=current_user.id, reason=reason)
     db.add(report)
+    bump_version(db, REPORTS)
     db.commit()
     return {"message": "Report submitted"}
 
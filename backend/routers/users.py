@@ -1,25 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from database import get_db
 from database_models import User
-from auth import hash_password, verify_password, create_access_token, create_refresh_token, get_current_user
-from schemas import UserCreate, TokenResponse, UserLogin, UserProfile, UserUpdate
+from auth import create_tokens, decode_token, credentials_exception, get_current_user
+from hashing import hash_password_async, verify_password_async
+import timeline
+import typeahead
+import user_cache
+from versioning import bump_version, USERS, SHOUTOUTS
+from schemas import UserCreate, TokenResponse, UserLogin, UserProfile, UserUpdate, RefreshRequest
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 
-@router.post("/register", response_model=TokenResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    # Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Hash password
-    hashed_password = hash_password(user.password)
-    
-    # Create user
+def find_user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def create_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     new_user = User(
         username=user.username,
         email=user.email,
@@ -28,38 +27,76 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         role=user.role
     )
     db.add(new_user)
+    # Flush for the id only: the user, their timeline and the version bump
+    # commit together, so a failure leaves no half-registered account
+    db.flush()
+
+    timeline.backfill(db, new_user)
+    typeahead.changed(db, new_user.id)
+    bump_version(db, USERS)
     db.commit()
-    db.refresh(new_user)
+    typeahead.index.upsert(new_user)
+    return new_user
+
+# register and login are async so bcrypt runs in the hashing pool, not in a
+# shared threadpool slot; their DB work still goes through the threadpool.
+@router.post("/register", response_model=TokenResponse)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    # Check if user exists
+    db_user = await run_in_threadpool(find_user_by_email, db, user.email)
+    if db_user:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create tokens
-    access_token = create_access_token(data={"sub": new_user.email})
-    refresh_token = create_refresh_token(data={"sub": new_user.email})
+    # Hash password
+    hashed_password = await hash_password_async(user.password)
+    
+    # Create user
+    new_user = await run_in_threadpool(create_user, db, user, hashed_password)
     
-    return TokenResponse(access_token=access_token, refresh_token=refresh_token)
+    # Create tokens
+    return TokenResponse(**create_tokens(new_user))
 
 @router.post("/login", response_model=TokenResponse)
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: Session = Depends(get_db)):
     # Find user
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = await run_in_threadpool(find_user_by_email, db, user.email)
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create tokens
-    access_token = create_access_token(data={"sub": db_user.email})
-    refresh_token = create_refresh_token(data={"sub": db_user.email})
-    
-    return TokenResponse(access_token=access_token, refresh_token=refresh_token)
+    return TokenResponse(**create_tokens(db_user))
+
+@router.post("/refresh", response_model=TokenResponse)
+def refresh_tokens(body: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token carrying current claims."""
+    claims = decode_token(body.refresh_token, credentials_exception())
+    if claims.get("type") != "refresh":
+        raise credentials_exception()
+
+    # One primary-key lookup; no password check
+    if "uid" in claims:
+        db_user = db.query(User).filter(User.id == claims["uid"]).first()
+    else:
+        db_user = db.query(User).filter(User.email == claims["sub"]).first()
+    if db_user is None:
+        raise credentials_exception()
+    # A revocation (role or department change, deletion) also ends refresh tokens
+    if claims.get("ver", 0) != (db_user.token_version or 0):
+        raise credentials_exception()
+
+    return TokenResponse(**create_tokens(db_user))
 
 @router.get("/profile", response_model=UserProfile)
-def get_user_profile(current_user: User = Depends(get_current_user)):
+def get_user_profile(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Get current user's profile information"""
+    joined_at = current_user.joined_at or db.query(User.joined_at).filter(User.id == current_user.id).scalar()
     return UserProfile(
         id=current_user.id,
         username=current_user.username,
         email=current_user.email,
         department=current_user.department,
         role=current_user.role,
-        joined_at=current_user.joined_at.isoformat()
+        joined_at=joined_at.isoformat()
     )
 
 @router.get("/all")
@@ -94,18 +131,33 @@ def update_user(
         raise HTTPException(status_code=404, detail="User not found")
 
     # Update only provided fields
-    for field, value in user_update.dict(exclude_unset=True).items():
+    changes = user_update.dict(exclude_unset=True)
+    changed = {field for field, value in changes.items() if value != getattr(db_user, field)}
+    for field, value in changes.items():
         setattr(db_user, field, value)
 
+    if "department" in changed:
+        # department_only posts they see are different now
+        timeline.reassign(db, db_user)
+    # Only changes to what the user may do end their sessions; a new name or
+    # email just drops the cached snapshot
+    user_cache.invalidate(db, user_id, revoke_tokens=bool(changed & {"role", "department"}))
+    typeahead.changed(db, user_id)
+    bump_version(db, USERS)
     db.commit()
     db.refresh(db_user)
-    return {
+    typeahead.index.upsert(db_user)
+    response = {
         "id": db_user.id,
         "username": db_user.username,
         "email": db_user.email,
         "department": db_user.department,
         "role": db_user.role,
     }
+    if current_user.id == user_id:
+        # Fresh claims for the caller; their old tokens stop working if revoked
+        response.update(create_tokens(db_user))
+    return response
 
 @router.delete("/{user_id}")
 def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -118,5 +170,9 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
         raise HTTPException(status_code=404, detail="User not found")
 
     db.delete(user)
+    user_cache.invalidate(db, user_id)
+    typeahead.changed(db, user_id)
+    bump_version(db, USERS, SHOUTOUTS)
     db.commit()
+    typeahead.index.remove(user_id)
     return {"detail": "User deleted successfully"}
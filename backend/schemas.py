@@ -39,6 +39,10 @@ class TokenResponse(BaseModel):
     token_type: str = "bearer"
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class UserProfile(BaseModel):
     id: int
     username: str
@@ -89,6 +93,13 @@ class ReactionResponse(BaseModel):
 class AddReactionRequest(BaseModel):
     reaction_type: str
 
+class ReactionChange(BaseModel):
+    shoutout_id: int
+    reaction_type: Optional[str] = None   # None removes the reaction
+
+class BulkReactionRequest(BaseModel):
+    changes: List[ReactionChange]
+
 class ReactionCountResponse(BaseModel):
     like: int = 0
     love: int = 0
@@ -135,6 +146,10 @@ class ShoutOutResponse(BaseModel):
         "from_attributes": True
     }
 
+class ShoutOutFeedPage(BaseModel):
+    items: List[ShoutOutResponse] = []
+    next_cursor: Optional[str] = None
+
 class ShoutOutUpdate(BaseModel):
     title: Optional[str] = None
     message: Optional[str] = None
@@ -156,6 +171,7 @@ class DepartmentStats(BaseModel):
 # ===== Comment Schemas =====
 class CommentCreate(BaseModel):
     content: str
+    parent_id: Optional[int] = None   # set to reply to a comment
 
 
 class CommentResponse(BaseModel):
@@ -169,6 +185,20 @@ class CommentResponse(BaseModel):
     created_at: datetime
     edited_at: datetime | None = None
     is_deleted: bool  
+    parent_id: Optional[int] = None
+    reply_count: int = 0
+    depth: int = 0                   # 0 for top-level comments
     model_config = {
         "from_attributes": True
     }
+
+
+class CommentPage(BaseModel):
+    items: List[CommentResponse] = []
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class CommentPreview(BaseModel):
+    total: int = 0
+    comments: List[CommentResponse] = []   # latest n, oldest first
@@ -0,0 +1,142 @@
+"""
+Materialized per-user home timelines (fan-out on write).
+
+create_shoutout copies a new shoutout into the timeline of every user allowed
+to see it; deletes and visibility edits retract those copies. Shoutouts whose
+audience is larger than TIMELINE_FANOUT_THRESHOLD (or that were written while
+the timeline was disabled) keep fanned_out = false and are merged into every
+timeline at read time instead.
+"""
+from sqlalchemy import exists, select, func, literal, tuple_, union_all, Integer, DateTime
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from config import TIMELINE_ENABLED, TIMELINE_FANOUT_THRESHOLD, TIMELINE_BACKFILL_SIZE
+from database_models import ShoutOut, TimelineEntry, User
+from pagination import encode_cursor, decode_cursor
+from visibility import visible_to, audience_of
+
+
+def fan_out(db: Session, shoutout: ShoutOut):
+    """Copy a shoutout into its audience's timelines. Call before db.commit()."""
+    if not TIMELINE_ENABLED:
+        return
+
+    audience = audience_of(shoutout)
+    audience_size = db.query(func.count(User.id)).filter(audience).scalar()
+    if audience_size > TIMELINE_FANOUT_THRESHOLD:
+        # Too many copies to write; readers pick it up from shoutouts directly
+        shoutout.fanned_out = False
+        return
+
+    entries = select(
+        User.id,
+        literal(shoutout.id, Integer),
+        literal(shoutout.created_at, DateTime),
+    ).where(audience)
+    db.execute(
+        insert(TimelineEntry)
+        .from_select(["user_id", "shoutout_id", "created_at"], entries)
+        .on_conflict_do_nothing()
+    )
+    shoutout.fanned_out = True
+
+
+def retract(db: Session, shoutout: ShoutOut):
+    """Remove a shoutout from every timeline it was copied into."""
+    db.query(TimelineEntry).filter(
+        TimelineEntry.shoutout_id == shoutout.id
+    ).delete(synchronize_session=False)
+    shoutout.fanned_out = False
+
+
+def refan(db: Session, shoutout: ShoutOut):
+    """Recompute the audience after a visibility change."""
+    retract(db, shoutout)
+    fan_out(db, shoutout)
+
+
+def backfill(db: Session, user: User):
+    """Seed a new user's timeline with the most recent fanned-out shoutouts they can see."""
+    if not TIMELINE_ENABLED:
+        return
+
+    recent = (
+        select(literal(user.id, Integer), ShoutOut.id, ShoutOut.created_at)
+        .where(
+            ShoutOut.is_deleted == False,
+            ShoutOut.fanned_out == True,
+            visible_to(user),
+        )
+        .order_by(ShoutOut.created_at.desc())
+        .limit(TIMELINE_BACKFILL_SIZE)
+    )
+    db.execute(
+        insert(TimelineEntry)
+        .from_select(["user_id", "shoutout_id", "created_at"], recent)
+        .on_conflict_do_nothing()
+    )
+
+
+def reassign(db: Session, user: User):
+    """
+    Bring a user's timeline in line with a department change: drop the entries
+    they can no longer see and backfill what they now can. Call before
+    db.commit(), once user.department holds the new value.
+    """
+    if not TIMELINE_ENABLED:
+        return
+
+    still_visible = exists().where(ShoutOut.id == TimelineEntry.shoutout_id, visible_to(user))
+    db.query(TimelineEntry).filter(
+        TimelineEntry.user_id == user.id, ~still_visible
+    ).delete(synchronize_session=False)
+    backfill(db, user)
+
+
+def timeline_page(db: Session, user: User, limit: int, cursor: str = None):
+    """
+    Shoutout ids for one page of the user's home timeline, newest first, and
+    the cursor for the next page. Timeline entries are merged with shoutouts
+    that were never fanned out; both sides are keyset-limited on their index.
+    """
+    entries = select(
+        TimelineEntry.shoutout_id.label("id"),
+        TimelineEntry.created_at.label("created_at"),
+    ).where(TimelineEntry.user_id == user.id)
+
+    unfanned = select(ShoutOut.id, ShoutOut.created_at).where(
+        ShoutOut.is_deleted == False,
+        ShoutOut.fanned_out == False,
+        visible_to(user),
+    )
+
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        entries = entries.where(
+            tuple_(TimelineEntry.created_at, TimelineEntry.shoutout_id)
+            < tuple_(last_created_at, last_id)
+        )
+        unfanned = unfanned.where(
+            tuple_(ShoutOut.created_at, ShoutOut.id) < tuple_(last_created_at, last_id)
+        )
+
+    entries = entries.order_by(
+        TimelineEntry.created_at.desc(), TimelineEntry.shoutout_id.desc()
+    ).limit(limit + 1).subquery()
+    unfanned = unfanned.order_by(
+        ShoutOut.created_at.desc(), ShoutOut.id.desc()
+    ).limit(limit + 1).subquery()
+
+    merged = union_all(select(entries), select(unfanned)).subquery()
+    rows = db.execute(
+        select(merged.c.id, merged.c.created_at)
+        .order_by(merged.c.created_at.desc(), merged.c.id.desc())
+        .limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return [r.id for r in rows], next_cursor
@@ -0,0 +1,223 @@
+"""
+In-process username typeahead for the tagging / receiver pickers.
+
+Users are indexed per department. Every 1-, 2- and 3-character substring of a
+name maps to the users whose names contain it: a 1-2 character term is a single
+lookup, and a longer term intersects the posting sets of its trigrams and then
+checks the candidates. Either way a term matches anywhere in the name, like
+the username ILIKE '%term%' it replaces.
+
+The index is built on first use (or warmed at startup). Writers call changed()
+in the transaction that adds, edits or removes a user. The NOTIFY reaches every
+worker on commit, and each one reloads just those users before its next
+search. After the listener reconnects, notifications may have been missed, so
+the index is rebuilt.
+"""
+import heapq
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import session
+from database_models import User
+from events import broker
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "bragboard_typeahead"
+
+
+def trigrams(name: str) -> set:
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+def grams(name: str) -> set:
+    """Every substring of 1 to 3 characters."""
+    return {name[i:i + n] for n in (1, 2, 3) for i in range(len(name) - n + 1)}
+
+
+def _entry(user) -> dict:
+    return {
+        "id": user.id, "username": user.username, "email": user.email,
+        "department": user.department, "role": user.role,
+    }
+
+
+def _rank(match):
+    # Prefix matches first, then alphabetical
+    name, term = match[0], match[2]
+    return (not name.startswith(term), name, match[1])
+
+
+class _Partition:
+    """Name index for one department."""
+
+    def __init__(self):
+        self.names = []                 # sorted (lowercase username, user id)
+        self.name_of = {}               # user id -> lowercase username
+        self.grams = defaultdict(set)   # 1-3 character substring -> user ids
+
+    def add(self, user_id: int, name: str):
+        insort(self.names, (name, user_id))
+        self.name_of[user_id] = name
+        for gram in grams(name):
+            self.grams[gram].add(user_id)
+
+    def remove(self, user_id: int):
+        name = self.name_of.pop(user_id, None)
+        if name is None:
+            return
+        i = bisect_left(self.names, (name, user_id))
+        if i < len(self.names) and self.names[i] == (name, user_id):
+            del self.names[i]
+        for gram in grams(name):
+            self.grams[gram].discard(user_id)
+            if not self.grams[gram]:
+                del self.grams[gram]
+
+    def search(self, term: str, limit: int) -> list:
+        """Up to `limit` (name, id, term) matches, best first."""
+        if not term:
+            return [(name, user_id, term) for name, user_id in self.names[:limit]]
+        if len(term) < 3:
+            matches = ((self.name_of[uid], uid, term) for uid in self.grams.get(term, ()))
+        else:
+            postings = sorted((self.grams.get(g, ()) for g in trigrams(term)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            matches = (
+                (self.name_of[uid], uid, term) for uid in candidates
+                if term in self.name_of[uid]
+            )
+        return heapq.nsmallest(limit, matches, key=_rank)
+
+
+class UserTypeahead:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}               # user id -> UserOut fields
+        self.partitions = {}            # department -> _Partition
+        self.built = False
+        self._changed = set()           # user ids announced since the last search
+
+    # ---------- building ----------
+    def rebuild(self, db: Session):
+        # Listen first, so changes committed while the build reads are not missed
+        broker.ensure_listener()
+        users = db.query(User.id, User.username, User.email, User.department, User.role).all()
+
+        entries, partitions = {}, defaultdict(_Partition)
+        for u in users:
+            entries[u.id] = _entry(u)
+            partitions[u.department].add(u.id, u.username.lower())
+
+        with self._lock:
+            self.entries, self.partitions = entries, dict(partitions)
+            self.built = True
+
+    def _ensure_fresh(self, db: Session):
+        if not self.built:
+            self.rebuild(db)
+            return
+        with self._lock:
+            user_ids, self._changed = self._changed, set()
+        if not user_ids:
+            return
+        users = {
+            u.id: u for u in
+            db.query(User.id, User.username, User.email, User.department, User.role)
+            .filter(User.id.in_(user_ids))
+        }
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in users:
+                    self._upsert_locked(users[user_id])
+                else:
+                    self._remove_locked(user_id)
+
+    def expire(self):
+        self.built = False
+
+    # ---------- notifications ----------
+    def mark_changed(self, user_id: int):
+        with self._lock:
+            self._changed.add(user_id)
+
+    # ---------- writes from this worker ----------
+    def upsert(self, user: User):
+        if not self.built:
+            return
+        with self._lock:
+            self._upsert_locked(user)
+
+    def remove(self, user_id: int):
+        if not self.built:
+            return
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def _upsert_locked(self, user):
+        self._remove_locked(user.id)
+        self.entries[user.id] = _entry(user)
+        self.partitions.setdefault(user.department, _Partition()).add(user.id, user.username.lower())
+
+    def _remove_locked(self, user_id: int):
+        old = self.entries.pop(user_id, None)
+        if old and old["department"] in self.partitions:
+            self.partitions[old["department"]].remove(user_id)
+
+    # ---------- reads ----------
+    def search(self, db: Session, term: str = None, department: str = None,
+               exclude_id: int = None, limit: int = 20) -> list:
+        """UserOut-shaped dicts whose username contains `term`, prefix matches first."""
+        self._ensure_fresh(db)
+        term = (term or "").strip().lower()
+
+        with self._lock:
+            if department and department != "all":
+                partitions = [self.partitions[department]] if department in self.partitions else []
+            else:
+                partitions = list(self.partitions.values())
+
+            matches = []
+            for partition in partitions:
+                matches.extend(partition.search(term, limit + 1))
+            matches.sort(key=_rank)
+
+            return [self.entries[uid] for _, uid, _ in matches if uid != exclude_id][:limit]
+
+
+index = UserTypeahead()
+
+
+def changed(db: Session, user_id: int):
+    """
+    Call inside the transaction that adds, edits or removes a user; every
+    worker reloads that user once it commits.
+    """
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": str(user_id)},
+    )
+
+
+def _on_notify(payload: str):
+    try:
+        index.mark_changed(int(payload))
+    except ValueError:
+        index.expire()
+
+
+broker.on(CHANNEL, _on_notify, on_gap=index.expire)
+
+
+def warm():
+    """Build the index ahead of the first search; failures just leave it lazy."""
+    db = session()
+    try:
+        index.rebuild(db)
+    except Exception as e:
+        logger.warning(f"Typeahead warm-up failed: {e}")
+    finally:
+        db.close()
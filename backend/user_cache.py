@@ -0,0 +1,154 @@
+"""
+Per-worker authentication state, so get_current_user does not query the users
+table on every request.
+
+cache holds a snapshot of each recently seen user, token_version included, so
+checking a token's "ver" claim is a lookup here rather than a query. Entries
+are keyed by the token subject (email), expire after USER_CACHE_TTL_SECONDS and
+are evicted least-recently-used beyond USER_CACHE_SIZE; a miss loads just that
+one user.
+
+Writers that change or remove a user call invalidate() inside their
+transaction: it updates this worker and NOTIFYs the others, whose event
+listener applies it once the transaction commits.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+from database_models import User
+from events import broker
+
+CHANNEL = "bragboard_user_cache"
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Read-only stand-in for a User row; carries the fields routers read from current_user."""
+    id: int
+    username: str
+    email: str
+    department: Optional[str]
+    role: str
+    is_active: bool
+    token_version: int
+    joined_at: Optional[datetime] = None
+
+    @property
+    def is_admin(self):
+        return self.role == "admin"
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        return cls(
+            id=user.id, username=user.username, email=user.email,
+            department=user.department, role=user.role,
+            is_active=user.is_active, token_version=user.token_version,
+            joined_at=user.joined_at,
+        )
+
+
+class UserCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # subject -> (expires_at, CachedUser)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a lookup that raced one is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, subject: str) -> Optional[CachedUser]:
+        broker.ensure_listener()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(subject)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[subject]
+            self.misses += 1
+            return None
+
+    def put(self, subject: str, user, generation: int) -> CachedUser:
+        snapshot = CachedUser.from_user(user)
+        with self._lock:
+            if generation != self.generation:
+                return snapshot
+            self._entries[subject] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return snapshot
+
+    def drop(self, user_id: int = None):
+        """Forget one user (by id, since their email may have changed) or everyone."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            if user_id is None:
+                self._entries.clear()
+                return
+            for subject, (_, cached) in list(self._entries.items()):
+                if cached.id == user_id:
+                    del self._entries[subject]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def invalidate(db: Session, user_id: int, revoke_tokens: bool = True):
+    """
+    Call inside the transaction that changes a user's email, role, department,
+    username or existence. With revoke_tokens the user's token_version is
+    bumped, so their outstanding access and refresh tokens stop being accepted;
+    do that only when the change affects what they may do.
+    Other workers hear about it when the transaction commits.
+    """
+    if revoke_tokens:
+        db.query(User).filter(User.id == user_id).update(
+            {User.token_version: User.token_version + 1}, synchronize_session=False
+        )
+    cache.drop(user_id)
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": str(user_id)},
+    )
+
+
+def _on_notify(payload: str):
+    try:
+        cache.drop(int(payload))
+    except ValueError:
+        cache.drop()
+
+
+def _on_gap():
+    # Notifications may have been missed while the listener was reconnecting
+    cache.drop()
+
+
+broker.on(CHANNEL, _on_notify, on_gap=_on_gap)
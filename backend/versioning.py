@@ -0,0 +1,103 @@
+"""
+Per-scope change counters and ETag helpers for conditional GETs.
+
+Every write marks the scopes it touches with bump_version() before
+db.commit(). The counters move only after that commit, in a short transaction
+of their own, so writers never queue on the shared scope rows while they hold
+their own locks. A reader in between sees new data under the old version; the
+bump then changes the ETag once more, which costs one extra 200 and never a
+stale 304.
+
+Read endpoints hash the current versions of the scopes they depend on, plus
+anything viewer-specific, into an ETag and answer a matching If-None-Match with
+304 before running their heavy queries.
+"""
+import hashlib
+import logging
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database import session
+from database_models import ResourceVersion
+
+logger = logging.getLogger(__name__)
+
+# Scopes
+SHOUTOUTS = "shoutouts"   # shoutouts, tags, reactions and comments
+USERS = "users"
+REPORTS = "reports"
+
+
+def bump_version(db: Session, *scopes: str):
+    """Bump the scopes once db's current transaction commits; a rollback drops them."""
+    db.info.setdefault("bump_scopes", set()).update(scopes)
+
+
+@event.listens_for(session, "after_commit")
+def _bump_committed(db):
+    scopes = db.info.pop("bump_scopes", None)
+    if not scopes:
+        return
+    table = ResourceVersion.__table__
+    # Fixed order so concurrent bumps lock the rows the same way
+    stmt = insert(table).values([{"scope": scope, "version": 1} for scope in sorted(scopes)])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.scope],
+        set_={"version": table.c.version + 1},
+    )
+    try:
+        with db.get_bind().begin() as conn:
+            conn.execute(stmt)
+    except Exception:
+        # The write itself is committed; ETags catch up with the next bump
+        logger.exception("Could not bump versions %s", sorted(scopes))
+
+
+@event.listens_for(session, "after_transaction_end")
+def _bump_discarded(db, transaction):
+    # Runs after _bump_committed on commit; otherwise the writes never landed
+    if transaction.parent is None:
+        db.info.pop("bump_scopes", None)
+
+
+def current_versions(db: Session, *scopes: str) -> dict:
+    rows = db.query(ResourceVersion.scope, ResourceVersion.version).filter(
+        ResourceVersion.scope.in_(scopes)
+    ).all()
+    versions = {scope: 0 for scope in scopes}
+    versions.update(dict(rows))
+    return versions
+
+
+def make_etag(db: Session, scopes, *viewer_parts) -> str:
+    versions = current_versions(db, *scopes)
+    raw = "|".join(
+        [f"{scope}={versions[scope]}" for scope in sorted(versions)]
+        + [str(part) for part in viewer_parts]
+    )
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def not_modified(request: Request, response: Response, etag: str):
+    """
+    Set the ETag on the response and return a 304 Response if the client
+    already has this version, else None.
+    """
+    response.headers["ETag"] = etag
+    # Let browsers keep the payload but revalidate it on every poll
+    response.headers["Cache-Control"] = "private, no-cache"
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+
+    # Weak comparison: W/"x" and "x" match
+    wanted = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == wanted:
+            return Response(status_code=304, headers={
+                "ETag": etag,
+                "Cache-Control": response.headers["Cache-Control"],
+            })
+    return None
@@ -0,0 +1,58 @@
+from sqlalchemy import or_, and_, true
+from database_models import ShoutOut, User
+from schemas import VisibilityEnum
+
+
+def visible_to(user: User):
+    """
+    SQL version of the shoutout visibility rules, for use in a WHERE clause:
+    public posts are visible to everyone, participants (giver / receiver) always
+    see their own posts and department_only posts are visible to both the
+    giver's and the receiver's department.
+    """
+    return or_(
+        ShoutOut.is_public == VisibilityEnum.public.value,
+        ShoutOut.giver_id == user.id,
+        ShoutOut.receiver_id == user.id,
+        and_(
+            ShoutOut.is_public == VisibilityEnum.department_only.value,
+            or_(
+                ShoutOut.giver_department == user.department,
+                ShoutOut.receiver_department == user.department,
+            ),
+        ),
+    )
+
+
+def audience_of(shoutout: ShoutOut):
+    """
+    The inverse of visible_to: a filter on User selecting everyone who may
+    see the given shoutout.
+    """
+    participants = User.id.in_([shoutout.giver_id, shoutout.receiver_id])
+
+    if shoutout.is_public == VisibilityEnum.public.value:
+        return true()
+    if shoutout.is_public == VisibilityEnum.department_only.value:
+        return or_(
+            participants,
+            User.department.in_([shoutout.giver_department, shoutout.receiver_department]),
+        )
+    return participants
+
+
+def can_view(user, shoutout) -> bool:
+    """
+    Python version of visible_to for a single shoutout. `shoutout` may be a
+    ShoutOut or a dict with the same visibility fields (as carried by events).
+    """
+    get = shoutout.get if isinstance(shoutout, dict) else lambda f: getattr(shoutout, f)
+
+    if get("is_public") == VisibilityEnum.public.value:
+        return True
+    if user.id in (get("giver_id"), get("receiver_id")):
+        return True
+    return (
+        get("is_public") == VisibilityEnum.department_only.value
+        and user.department in (get("giver_department"), get("receiver_department"))
+    )
@@ -12,7 +12,9 @@ const emojiOptions = [
   { type: "star", emoji: "⭐", label: "Star" },
 ];
 
-const ReactionBar = ({ shoutout }) => {
+// summary: counts from the feed's batched /reactions/summary call; null while it
+// is loading. Without the prop the bar fetches its own counts.
+const ReactionBar = ({ shoutout, summary }) => {
   const [reactions, setReactions] = useState({
     my_reaction: null,
     like: 0,
@@ -73,8 +75,9 @@ const ReactionBar = ({ shoutout }) => {
     });
 
     try {
-      await ApiService.addReaction(shoutout.id, type);
-      fetchReactions();
+      // The response carries the new state and counts; no refetch needed
+      const data = await ApiService.addReaction(shoutout.id, type);
+      setReactions((prev) => ({ ...prev, ...data.counts, my_reaction: data.my_reaction }));
     } catch (err) {
       console.error("Reaction Error:", err);
     }
@@ -97,8 +100,9 @@ const ReactionBar = ({ shoutout }) => {
   );
 
   useEffect(() => {
-    fetchReactions();
-  }, [shoutout.id]);
+    if (summary === undefined) fetchReactions();
+    else if (summary) setReactions((prev) => ({ ...prev, ...summary }));
+  }, [shoutout.id, summary]);
 
   return (
     <>
@@ -30,6 +30,8 @@ export default function ShoutOutFeed({
   const [openMenuId, setOpenMenuId] = useState(null);
   const [openCommentsId, setOpenCommentsId] = useState(null);
   const [commentCounts, setCommentCounts] = useState({}); // { [shoutId]: count }
+  const [reactionSummaries, setReactionSummaries] = useState({}); // { [shoutId]: counts }
+  const [summaryFailed, setSummaryFailed] = useState(false);
   const [showMobileFilters, setShowMobileFilters] = useState(false);
   const [isMobile, setIsMobile] = useState(false);
 
@@ -111,6 +113,24 @@ export default function ShoutOutFeed({
     if (shoutoutUpdated) fetchShoutouts();
   }, [shoutoutUpdated]);
 
+  // One summary request per 100 cards instead of one counts request per card
+  useEffect(() => {
+    const ids = shoutouts.map((s) => s.id);
+    if (!ids.length) return;
+    const chunks = [];
+    for (let i = 0; i < ids.length; i += 100) chunks.push(ids.slice(i, i + 100));
+
+    Promise.all(chunks.map((chunk) => ApiService.getReactionSummary(chunk)))
+      .then((results) => {
+        setReactionSummaries(Object.assign({}, ...results));
+        setSummaryFailed(false);
+      })
+      .catch((err) => {
+        console.error("Failed to fetch reaction summary", err);
+        setSummaryFailed(true);
+      });
+  }, [shoutouts]);
+
   // Filtering
   useEffect(() => {
     let result = [...shoutouts];
@@ -656,7 +676,10 @@ export default function ShoutOutFeed({
                 )}
 
                 <div className="flex justify-between items-center mt-5 pt-3 border-t border-gray-200">
-                  <ReactionBar shoutout={shout} />
+                  <ReactionBar
+                    shoutout={shout}
+                    summary={summaryFailed ? undefined : reactionSummaries[shout.id] ?? null}
+                  />
 
                   <button
                     onClick={() =>
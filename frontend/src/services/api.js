@@ -4,6 +4,30 @@ import axios from "axios";
 const API_BASE_URL = "https://bragboard-backend.onrender.com";
 
 class ApiService {
+  constructor() {
+    this.refreshing = null;
+    // An expired or revoked access token gets one refresh and one retry
+    axios.interceptors.response.use(undefined, async (error) => {
+      const config = error.config;
+      if (
+        error.response?.status !== 401 ||
+        !config ||
+        config._retried ||
+        !localStorage.getItem("refresh_token")
+      )
+        throw error;
+      config._retried = true;
+      let token;
+      try {
+        token = await this.refreshToken();
+      } catch {
+        throw error;
+      }
+      config.headers.Authorization = `Bearer ${token}`;
+      return axios(config);
+    });
+  }
+
   getToken() {
     return localStorage.getItem("access_token");
   }
@@ -35,8 +59,46 @@ class ApiService {
     return await res.json();
   }
 
+  refreshToken() {
+    // Requests failing together share one refresh
+    if (!this.refreshing) {
+      this.refreshing = this.requestRefresh().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
+  async requestRefresh() {
+    const res = await fetch(`${API_BASE_URL}/users/refresh`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: localStorage.getItem("refresh_token") }),
+    });
+    if (!res.ok) throw new Error((await res.json()).detail || "Session expired");
+    const { access_token, refresh_token } = await res.json();
+    localStorage.setItem("access_token", access_token);
+    localStorage.setItem("refresh_token", refresh_token);
+    return access_token;
+  }
+
+  // fetch() with the same refresh-and-retry on 401 as the axios interceptor
+  async authFetch(url, options = {}) {
+    const res = await fetch(url, options);
+    if (res.status !== 401 || !localStorage.getItem("refresh_token")) return res;
+    try {
+      await this.refreshToken();
+    } catch {
+      return res;
+    }
+    return fetch(url, {
+      ...options,
+      headers: { ...options.headers, ...this.getHeaders() },
+    });
+  }
+
   async getUserProfile() {
-    const res = await fetch(`${API_BASE_URL}/users/profile`, {
+    const res = await this.authFetch(`${API_BASE_URL}/users/profile`, {
       headers: this.getHeaders(),
     });
     if (!res.ok)
@@ -46,7 +108,7 @@ class ApiService {
 
   // -------------------- GET ALL USERS --------------------
   async getAllUsers() {
-    const res = await fetch(`${API_BASE_URL}/users/all`, {
+    const res = await this.authFetch(`${API_BASE_URL}/users/all`, {
       headers: this.getHeaders(),
     });
     if (!res.ok) throw new Error("Failed to fetch users");
@@ -104,7 +166,7 @@ class ApiService {
 
   // -------------------- GET SHOUTOUTS (FEED) --------------------
   async getShoutouts({ department = "all", skip = 0, limit = 50 } = {}) {
-    const res = await fetch(
+    const res = await this.authFetch(
       `${API_BASE_URL}/shoutouts/feed?department=${department}&skip=${skip}&limit=${limit}`,
       {
         headers: this.getHeaders(),
@@ -116,10 +178,12 @@ class ApiService {
   }
 
   // -------------------- GET MY SHOUTOUTS --------------------
-  async getMyShoutouts({ receiver_department = "all", days } = {}) {
+  async getMyShoutouts({ receiver_department = "all", days, limit, cursor } = {}) {
     let url = `${API_BASE_URL}/shoutouts/my-shoutouts?receiver_department=${receiver_department}`;
     if (days) url += `&days=${days}`;
-    const res = await fetch(url, { headers: this.getHeaders() });
+    if (limit) url += `&limit=${limit}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    const res = await this.authFetch(url, { headers: this.getHeaders() });
     if (!res.ok) {
       const error = await res.json();
       throw new Error(error.detail || "Failed to fetch my shoutouts");
@@ -129,7 +193,7 @@ class ApiService {
 
   // -------------------- SEARCH USERS --------------------
   async searchUsers({ department = "all", search = "" } = {}) {
-    const res = await fetch(
+    const res = await this.authFetch(
       `${API_BASE_URL}/shoutouts/users/search?department=${department}&search=${search}`,
       {
         headers: this.getHeaders(),
@@ -150,6 +214,16 @@ class ApiService {
     return res.data;
   }
 
+  // changes: [{ shoutout_id, reaction_type }], reaction_type null removes it
+  async bulkReactions(changes) {
+    const res = await axios.post(
+      `${API_BASE_URL}/reactions/bulk`,
+      { changes },
+      { headers: this.getHeaders() }
+    );
+    return res.data;
+  }
+
   async getReactionCounts(shoutout_id) {
     const res = await axios.get(`${API_BASE_URL}/reactions/${shoutout_id}`, {
       headers: this.getHeaders(),
@@ -157,37 +231,76 @@ class ApiService {
     return res.data;
   }
 
-  async getReactedUsers(shoutout_id) {
+  // Counts and my_reaction for many shoutouts: { [id]: { like, love, ..., my_reaction } }
+  async getReactionSummary(ids) {
+    const res = await axios.get(`${API_BASE_URL}/reactions/summary`, {
+      params: { ids: ids.join(",") },
+      headers: this.getHeaders(),
+    });
+    return res.data;
+  }
+
+  // Without type: { [type]: { total, users: [names] } } with the latest k names.
+  // With type: { users, next_cursor }; pass next_cursor back for more.
+  async getReactedUsers(shoutout_id, { type, cursor, limit, k } = {}) {
     const res = await axios.get(
       `${API_BASE_URL}/reactions/${shoutout_id}/users`,
-      { headers: this.getHeaders() }
+      { params: { type, cursor, limit, k }, headers: this.getHeaders() }
     );
     return res.data;
   }
   // --------------------- COMMENTS -------------------------
+  // Latest n comments per shoutout: { [id]: { total, comments } }
+  async getCommentPreviews(ids, n = 3) {
+    const res = await axios.get(`${API_BASE_URL}/comments/preview`, {
+      params: { ids: ids.join(","), n },
+      headers: this.getHeaders(),
+    });
+    return res.data;
+  }
+
   async getComments(shoutoutId) {
-    const res = await fetch(`${API_BASE_URL}/comments/${shoutoutId}`, {
+    const res = await this.authFetch(`${API_BASE_URL}/comments/${shoutoutId}`, {
       headers: this.getHeaders(),
     });
     if (!res.ok) throw new Error("Failed to fetch comments");
     return res.json();
   }
 
-  async addComment(shoutoutId, content) {
-    const res = await fetch(`${API_BASE_URL}/comments/${shoutoutId}`, {
+  // Top-level comments with reply_count. Pass cursor (next_cursor) to go
+  // forward or before (prev_cursor) to go back: { items, next_cursor, prev_cursor }
+  async getCommentPage(shoutoutId, { cursor = "", before, limit = 20 } = {}) {
+    const res = await axios.get(`${API_BASE_URL}/comments/${shoutoutId}`, {
+      params: before ? { before, limit } : { cursor, limit },
+      headers: this.getHeaders(),
+    });
+    return res.data;
+  }
+
+  // A comment and all replies below it, in thread order (each item has depth)
+  async getCommentThread(commentId, { cursor = "", limit = 100 } = {}) {
+    const res = await axios.get(`${API_BASE_URL}/comments/thread/${commentId}`, {
+      params: { cursor, limit },
+      headers: this.getHeaders(),
+    });
+    return res.data;
+  }
+
+  async addComment(shoutoutId, content, parentId = null) {
+    const res = await this.authFetch(`${API_BASE_URL}/comments/${shoutoutId}`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
         ...this.getHeaders(),
       },
-      body: JSON.stringify({ content }),
+      body: JSON.stringify({ content, parent_id: parentId }),
     });
     if (!res.ok) throw new Error("Failed to add comment");
     return res.json();
   }
 
   async deleteComment(comment_id) {
-    const res = await fetch(`${API_BASE_URL}/comments/${comment_id}`, {
+    const res = await this.authFetch(`${API_BASE_URL}/comments/${comment_id}`, {
       method: "DELETE",
       headers: this.getHeaders(),
     });
@@ -195,7 +308,7 @@ class ApiService {
   }
 
   async updateComment(commentId, content) {
-    return fetch(`${API_BASE_URL}/comments/${commentId}`, {
+    return this.authFetch(`${API_BASE_URL}/comments/${commentId}`, {
       method: "PUT",
       headers: {
         "Content-Type": "application/json",
@@ -227,7 +340,7 @@ class ApiService {
 
   // -------------------- DASHBOARD --------------------
   async getDashboardStats() {
-    const res = await fetch(`${API_BASE_URL}/shoutouts/dashboard/stats`, {
+    const res = await this.authFetch(`${API_BASE_URL}/shoutouts/dashboard/stats`, {
       headers: this.getHeaders(),
     });
     if (!res.ok)
@@ -249,7 +362,13 @@ class ApiService {
         },
       }
     );
-    return res.data;
+    // Updating your own profile returns new tokens carrying the new claims
+    const { access_token, refresh_token, ...user } = res.data;
+    if (access_token) {
+      localStorage.setItem("access_token", access_token);
+      localStorage.setItem("refresh_token", refresh_token);
+    }
+    return user;
   }
 
   // -------------------- DELETE USER ACCOUNT --------------------
@@ -359,7 +478,7 @@ class ApiService {
 
   // -------------------- EXPORT REPORTS --------------------
   async exportShoutoutsCSV() {
-    const res = await fetch(`${API_BASE_URL}/admin/export/shoutouts/csv`, {
+    const res = await this.authFetch(`${API_BASE_URL}/admin/export/shoutouts/csv`, {
       headers: this.getHeaders(),
     });
 
@@ -368,7 +487,7 @@ class ApiService {
   }
 
   async exportShoutoutsPDF() {
-    const res = await fetch(`${API_BASE_URL}/admin/export/shoutouts/pdf`, {
+    const res = await this.authFetch(`${API_BASE_URL}/admin/export/shoutouts/pdf`, {
       headers: this.getHeaders(),
     });
 
@@ -378,7 +497,7 @@ class ApiService {
 
   // -------------------- ACHIEVEMENTS --------------------
   async getAchievements() {
-    const res = await fetch(`${API_BASE_URL}/achievements/`, {
+    const res = await this.authFetch(`${API_BASE_URL}/achievements/`, {
       headers: this.getHeaders(),
     });
     if (!res.ok) throw new Error("Failed to fetch achievements");
@@ -387,7 +506,7 @@ class ApiService {
 
   // -------------------- LEADERBOARD --------------------
   async getLeaderboard(top_n = 5) {
-    const res = await fetch(
+    const res = await this.authFetch(
       `${API_BASE_URL}/achievements/leaderboard?top_n=${top_n}`,
       {
         headers: this.getHeaders(),